@@ -3,12 +3,16 @@ reports.py - Trade logging, Telegram notifications, daily/weekly/monthly reports
 DRY_RUN compatible, Gemini meme image generation
 """
 
+import atexit
 import csv
 import datetime
 import sys
 import json
 import os
+import queue
 import random
+import threading
+import time
 from io import BytesIO
 from typing import Any, Dict, List, Optional
 
@@ -21,14 +25,17 @@ from utils import (
     DRY_RUN,
     TELEGRAM_BOT_TOKEN,
     TELEGRAM_CHAT_ID,
+    fmt_usd,
     get_sol_price_usd,
     logger,
     md_code,
     resolve_token_name,
+    telegram_post,
 )
 
-# Load environment
-load_dotenv(dotenv_path=os.path.expanduser("~/t.env"))
+# Load environment; utils already loaded its t.env, so this only fills keys
+# (e.g. GEMINI_API_KEY) that are still unset
+load_dotenv(dotenv_path=os.path.expanduser("~/t.env"), override=False)
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY", "")
 REPORTS_FILE = os.getenv("REPORTS_FILE", "trade_logs.json")
 DEFAULT_EXPORT_CSV = os.getenv("REPORT_EXPORT_CSV", "trade_logs_export.csv")
@@ -36,11 +43,25 @@ STOP_LOSS = float(os.getenv("STOP_LOSS", "-20") or -20.0)
 TAKE_PROFIT = float(os.getenv("TAKE_PROFIT", "100") or 100.0)
 BUY_FEE_PERCENT = float(os.getenv("BUY_FEE_PERCENT", "1.0") or 1.0)
 SELL_FEE_PERCENT = float(os.getenv("SELL_FEE_PERCENT", "1.0") or 1.0)
+TELEGRAM_API_URL = f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}"
+HTTP_TIMEOUT = 15
+
+# One pooled session for every Telegram/Gemini call made from this module
+_http = requests.Session()
 
 
 # -------------------------
 # Telegram helper
 # -------------------------
+# Legacy Markdown reserved characters; escape dynamic fields so a stray
+# "_" or "`" in a coin name can't make Telegram reject the message
+_MD_ESCAPE = str.maketrans({c: "\\" + c for c in "_*`["})
+
+
+def _md_escape(text: str) -> str:
+    return str(text).translate(_MD_ESCAPE)
+
+
 def send_telegram_message(text: str, image_path: Optional[str] = None) -> None:
     """Send Telegram message; respects DRY_RUN"""
     if DRY_RUN or not TELEGRAM_BOT_TOKEN or not TELEGRAM_CHAT_ID:
@@ -49,20 +70,22 @@ def send_telegram_message(text: str, image_path: Optional[str] = None) -> None:
             print(f"[Image would be sent: {image_path}]")
         return
     try:
-        url = f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/sendMessage"
+        url = f"{TELEGRAM_API_URL}/sendMessage"
         payload = {
             "chat_id": int(TELEGRAM_CHAT_ID),
             "text": text,
             "parse_mode": "Markdown",
         }
-        resp = requests.post(url, json=payload, timeout=15)
+        resp = telegram_post(url, post=_http.post, json=payload, timeout=HTTP_TIMEOUT)
         if resp.ok and image_path:
             with open(image_path, "rb") as photo:
-                requests.post(
-                    f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/sendPhoto",
+                telegram_post(
+                    f"{TELEGRAM_API_URL}/sendPhoto",
+                    post=_http.post,
+                    retries=0,
                     data={"chat_id": TELEGRAM_CHAT_ID, "caption": text},
                     files={"photo": photo},
-                    timeout=15,
+                    timeout=HTTP_TIMEOUT,
                 )
         if not resp.ok:
             logger.error(f"Telegram API error: {resp.text}")
@@ -70,37 +93,113 @@ def send_telegram_message(text: str, image_path: Optional[str] = None) -> None:
         logger.error(f"Failed to send Telegram message: {e}")
 
 
+# -------------------------
+# Batched trade notifications
+# -------------------------
+# Trade messages are coalesced for up to NOTIFY_BATCH_WINDOW_SEC or
+# NOTIFY_BATCH_MAX items and sent as one message, which keeps bursts of
+# buys/sells under Telegram's per-chat rate limit.
+NOTIFY_BATCH_MAX = 10
+NOTIFY_BATCH_WINDOW_SEC = 0.5
+_notify_queue: "queue.Queue[str]" = queue.Queue()
+_notify_thread: Optional[threading.Thread] = None
+_notify_lock = threading.Lock()
+
+
+def _notify_worker() -> None:
+    while True:
+        batch = [_notify_queue.get()]
+        deadline = time.monotonic() + NOTIFY_BATCH_WINDOW_SEC
+        while len(batch) < NOTIFY_BATCH_MAX:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(_notify_queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        try:
+            send_telegram_message("\n\n".join(batch))
+        finally:
+            for _ in batch:
+                _notify_queue.task_done()
+
+
+def notify_trade(text: str) -> None:
+    """Queue a trade notification for the next batched Telegram send."""
+    global _notify_thread
+    with _notify_lock:
+        if _notify_thread is None:
+            _notify_thread = threading.Thread(
+                target=_notify_worker, name="trade-notify", daemon=True
+            )
+            _notify_thread.start()
+    _notify_queue.put(text)
+
+
+def flush_trade_notifications() -> None:
+    """Block until every queued trade notification has been sent."""
+    if _notify_thread is not None:
+        _notify_queue.join()
+
+
+atexit.register(flush_trade_notifications)
+
+
 # -------------------------
 # Logs helpers
 # -------------------------
 def ensure_logs_file(path: str = REPORTS_FILE) -> None:
     if not os.path.exists(path):
-        with open(path, "w") as f:
-            json.dump([], f)
+        save_logs([], path)
 
 
 def load_logs(path: str = REPORTS_FILE) -> List[Dict[str, Any]]:
-    ensure_logs_file(path)
+    # save_logs is atomic, so a missing file is the only expected miss
     try:
         with open(path, "r") as f:
             data = json.load(f)
-            if isinstance(data, list):
-                return data
-            if isinstance(data, dict) and "logs" in data:
-                return data["logs"]
-            return []
-    except Exception:
+    except FileNotFoundError:
         return []
+    except (OSError, ValueError) as e:
+        logger.error(f"Failed to read trade logs {path}: {e}")
+        return []
+    if isinstance(data, list):
+        return data
+    if isinstance(data, dict) and "logs" in data:
+        return data["logs"]
+    return []
 
 
 def save_logs(logs: List[Dict[str, Any]], path: str = REPORTS_FILE) -> None:
-    with open(path, "w") as f:
+    """Write logs atomically: temp file + fsync, then os.replace over path."""
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
         json.dump(logs, f, indent=2, default=str)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
 
 
 # -------------------------
 # Record trades
 # -------------------------
+# token -> index of its most recent unsold entry in the logs list
+_OPEN_POSITIONS: Dict[str, int] = {}
+_open_positions_loaded = False
+
+
+def _open_positions(logs: List[Dict[str, Any]]) -> Dict[str, int]:
+    """Return the open-position index, building it from logs on first use."""
+    global _open_positions_loaded
+    if not _open_positions_loaded:
+        for i, entry in enumerate(logs):
+            if entry.get("sell_time") is None and entry.get("token"):
+                _OPEN_POSITIONS[entry["token"]] = i
+        _open_positions_loaded = True
+    return _OPEN_POSITIONS
+
+
 def record_buy(
     token: str,
     coin_name: Optional[str],
@@ -125,10 +224,12 @@ def record_buy(
         "date": str(datetime.datetime.utcnow().date()),
     }
     logs = load_logs()
+    open_positions = _open_positions(logs)
     logs.append(entry)
     save_logs(logs)
-    send_telegram_message(
-        f"✅   BUY {coin_name} | Amount: ${amount_usd:.2f} | CA: {md_code(token)}"
+    open_positions[token] = len(logs) - 1
+    notify_trade(
+        f"✅   BUY {_md_escape(coin_name)} | Amount: ${amount_usd:.2f} | CA: {md_code(token)}"
     )
 
 
@@ -139,7 +240,18 @@ def record_sell(
     priority_fee_sol: Optional[float],
 ) -> None:
     logs = load_logs()
-    for entry in reversed(logs):
+    idx = _open_positions(logs).pop(token, None)
+    if (
+        idx is not None
+        and idx < len(logs)
+        and logs[idx].get("token") == token
+        and logs[idx].get("sell_time") is None
+    ):
+        candidates = [logs[idx]]
+    else:
+        # stale index (e.g. file edited externally): fall back to a reverse scan
+        candidates = reversed(logs)
+    for entry in candidates:
         if entry.get("token") == token and entry.get("sell_time") is None:
             entry.update(
                 {
@@ -151,8 +263,8 @@ def record_sell(
                 }
             )
             save_logs(logs)
-            send_telegram_message(
-                f"🟣 SELL {entry['coin_name']} | Profit: ${profit_usd:.2f} | CA: {md_code(token)}"
+            notify_trade(
+                f"🟣 SELL {_md_escape(entry['coin_name'])} | Profit: ${profit_usd:.2f} | CA: {md_code(token)}"
             )
             return
 
@@ -174,8 +286,8 @@ def report_trade_summary(
     text = (
         f"📝 Trade Summary:\n"
         f"CA: {md_code(contract_address)}\n"
-        f"Buy Market Cap: ${buy_market_cap}\n"
-        f"Sell Market Cap: ${sell_market_cap}\n"
+        f"Buy Market Cap: {fmt_usd(buy_market_cap)}\n"
+        f"Sell Market Cap: {fmt_usd(sell_market_cap)}\n"
         f"Profit %: {profit_percent:.2f}%\n"
         f"TX Buy: {tx_buy}\n"
         f"TX Sell: {tx_sell}\n"
@@ -183,7 +295,7 @@ def report_trade_summary(
         f"Priority Fee SOL: {priority_fee_sol}\n"
         f"Current USD Balance: ${current_usd_balance:.2f}"
     )
-    send_telegram_message(text)
+    notify_trade(text)
 
 
 # -------------------------
@@ -205,30 +317,31 @@ def calculate_period_data(
     initial_capital_usd = 0.0
     coins_bought = set()
     daily_profits = {}
+    # Stored dates are ISO "YYYY-MM-DD", so plain string compares replace strptime
+    today_str = now.strftime("%Y-%m-%d")
+    month_prefix = now.strftime("%Y-%m-")
+    week_floor = (now.date() - datetime.timedelta(days=7)).isoformat()
+    # local aliases for the per-entry loop
+    sf = _safe_float
+    add_coin = coins_bought.add
+    day_total = daily_profits.get
     for entry in logs:
-        try:
-            trade_date = datetime.datetime.strptime(
-                entry.get("date", ""), "%Y-%m-%d"
-            ).date()
-            if period == "daily" and trade_date == now.date():
-                total_profit_usd += _safe_float(entry.get("profit_usd"))
-                initial_capital_usd += _safe_float(entry.get("amount_usd"))
-                if entry.get("coin_name"):
-                    coins_bought.add(entry["coin_name"])
-            elif period == "weekly" and (now.date() - trade_date).days < 7:
-                total_profit_usd += _safe_float(entry.get("profit_usd"))
-            elif (
-                period == "monthly"
-                and trade_date.month == now.month
-                and trade_date.year == now.year
-            ):
-                total_profit_usd += _safe_float(entry.get("profit_usd"))
-                date_str = str(trade_date)
-                daily_profits[date_str] = daily_profits.get(
-                    date_str, 0.0
-                ) + _safe_float(entry.get("profit_usd"))
-        except Exception:
+        get = entry.get
+        date_str = get("date")
+        if not isinstance(date_str, str) or len(date_str) != 10:
             continue
+        if period == "daily" and date_str == today_str:
+            total_profit_usd += sf(get("profit_usd"))
+            initial_capital_usd += sf(get("amount_usd"))
+            coin_name = get("coin_name")
+            if coin_name:
+                add_coin(coin_name)
+        elif period == "weekly" and date_str > week_floor:
+            total_profit_usd += sf(get("profit_usd"))
+        elif period == "monthly" and date_str.startswith(month_prefix):
+            profit = sf(get("profit_usd"))
+            total_profit_usd += profit
+            daily_profits[date_str] = day_total(date_str, 0.0) + profit
     total_profit_sol = total_profit_usd / sol_price if sol_price else 0.0
     return {
         "total_profit_usd": total_profit_usd,
@@ -323,12 +436,12 @@ def generate_meme_image(
             "height": 1080,
             "num_images": 1,
         }
-        response = requests.post(
-            url, headers=headers, json=payload, timeout=30
+        response = _http.post(
+            url, headers=headers, json=payload, timeout=HTTP_TIMEOUT * 2
         )
         response.raise_for_status()
         image_url = response.json().get("images")[0].get("url")
-        img_response = requests.get(image_url, timeout=30)
+        img_response = _http.get(image_url, timeout=HTTP_TIMEOUT * 2)
         img_response.raise_for_status()
         image_path = (
             f"profit_{period}_{int(datetime.datetime.now().timestamp())}.png"
@@ -363,8 +476,10 @@ def generate_report(logs: List[Dict[str, Any]], period: str):
     period_data = calculate_period_data(logs, period)
     try:
         telegram_username = (
-            requests.get(
-                f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/getChat?chat_id={TELEGRAM_CHAT_ID}"
+            _http.get(
+                f"{TELEGRAM_API_URL}/getChat",
+                params={"chat_id": TELEGRAM_CHAT_ID},
+                timeout=HTTP_TIMEOUT,
             )
             .json()
             .get("result", {})
@@ -373,21 +488,21 @@ def generate_report(logs: List[Dict[str, Any]], period: str):
     except Exception:
         telegram_username = "UnknownUser"
     image_path = generate_meme_image(period_data, period, telegram_username)
-    header = [
+    get = period_data.get
+    # header, blank separator, then period-specific lines; joined once
+    out = [
         f"*Configured SL/TP:* {STOP_LOSS:.1f}% / {TAKE_PROFIT:.1f}%",
-        f"*Total profit ({period.capitalize()}):* {period_data['total_profit_sol']:.2f} SOL (${period_data['total_profit_usd']:.2f})",
+        f"*Total profit ({period.capitalize()}):* {get('total_profit_sol'):.2f} SOL (${get('total_profit_usd'):.2f})",
+        "",
     ]
-    lines = []
     if period == "daily":
-        coins = period_data.get("coins_bought")
+        coins = get("coins_bought")
         if coins:
-            lines.append(f"*Coins Bought:* {', '.join(coins)}")
-        lines.append(
-            f"*Initial Capital:* ${period_data.get('initial_capital_usd',0.0):.2f}"
-        )
+            out.append(f"*Coins Bought:* {_md_escape(', '.join(coins))}")
+        out.append(f"*Initial Capital:* ${get('initial_capital_usd') or 0.0:.2f}")
     elif period == "monthly":
-        lines.append(f"*Month:* {period_data['month']}")
-    return "\n".join(header) + "\n\n" + "\n".join(lines), image_path
+        out.append(f"*Month:* {get('month')}")
+    return "\n".join(out), image_path
 
 
 def send_daily_report():
@@ -551,6 +666,7 @@ def main(argv: Optional[List[str]] = None):
             priority_fee = round(uniform(0.03, 0.2), 3)
             record_buy(token, None, buy_mc, amount, priority_fee)
             record_sell(token, sell_mc, profit, priority_fee)
+        flush_trade_notifications()
         print(f"[+] Generated {args.simulate_count} simulated trades")
         send_daily_report()
     else:
@@ -10,18 +10,26 @@ sniper.py
 
 from __future__ import annotations
 import asyncio
+import atexit
 import json
 import logging
 import os
 import aiohttp
-import statistics
+import orjson
+import random
 import re
+import base58
 import base64
+import heapq
+import signal
 import time
-from datetime import date, datetime
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
 from typing import Optional
 from loguru import logger
 from telethon import TelegramClient, events
+from telethon.errors import FloodWaitError
 import utils
 
 from solders.message import to_bytes_versioned
@@ -42,19 +50,14 @@ if not logger.handlers:
 logger.setLevel(logging.DEBUG if os.getenv("LOG_LEVEL", "INFO").upper() == "DEBUG" else logging.INFO)
 
 # ============================================================
-# REFERRAL SETTINGS (optional)
+# REFERRAL SETTINGS (optional) — parsed and logged once in utils
 # ============================================================
-REFERRAL_BPS = int(os.getenv("REFERRAL_FEE_BPS", "0"))
-REFERRAL_ACCOUNT = os.getenv("REFERRAL_ACCOUNT", "").strip()
-
-if REFERRAL_ACCOUNT:
-    logger.info(f"📎 Using referral account {REFERRAL_ACCOUNT} ({REFERRAL_BPS} bps)")
-else:
-    logger.info("📎 No referral account configured.")
-# ---------- Config (from t.env) ----------
-DRY_RUN = int(os.environ.get("DRY_RUN", "1"))
-TELEGRAM_BOT_TOKEN = os.environ.get("TELEGRAM_BOT_TOKEN", "")
-TELEGRAM_CHAT_ID = os.environ.get("TELEGRAM_CHAT_ID", "")
+REFERRAL_BPS = utils.REFERRAL_BPS
+REFERRAL_ACCOUNT = utils.REFERRAL_ACCOUNT
+# ---------- Config (from t.env, loaded by utils) ----------
+DRY_RUN = os.environ.get("DRY_RUN", "0").lower() in ("1", "true", "yes")
+TELEGRAM_BOT_TOKEN = utils.TELEGRAM_BOT_TOKEN
+TELEGRAM_CHAT_ID = utils.TELEGRAM_CHAT_ID
 API_ID = int(os.environ.get("TELEGRAM_API_ID", "0"))
 API_HASH = os.environ.get("TELEGRAM_API_HASH", "")
 TARGET_CHANNEL_ID = int(os.environ.get("TARGET_CHANNEL_ID", "0"))
@@ -63,7 +66,7 @@ SESSION_NAME = os.environ.get("SESSION_NAME", "sniper_session")
 DEXSCREENER_API = "https://api.dexscreener.com/latest/dex/tokens"
 # Trading config
 DAILY_CAPITAL_USD = float(os.environ.get("DAILY_CAPITAL_USD", "10"))
-MAX_BUYS_PER_DAY = int(os.environ.get("MAX_BUYS_PER_DAY", "10"))
+MAX_BUYS_PER_DAY = int(os.environ.get("MAX_BUYS_PER_DAY", "50"))
 BUY_FEE_PERCENT = float(os.environ.get("BUY_FEE_PERCENT", "1.0"))
 SELL_FEE_PERCENT = float(os.environ.get("SELL_FEE_PERCENT", "1.0"))
 STOP_LOSS = float(os.environ.get("STOP_LOSS", "-20"))  # percent, negative number
@@ -71,12 +74,72 @@ TAKE_PROFIT = float(os.environ.get("TAKE_PROFIT", "40"))  # percent
 TRADE_SLEEP_SEC = float(os.environ.get("TRADE_SLEEP_SEC", "5.0"))
 TARGET_MULTIPLIER = float(os.environ.get("TARGET_MULTIPLIER", "1.4"))
 CYCLE_LIMIT_RAW = os.environ.get("CYCLE_LIMIT", "")
-CYCLE_LIMIT = ([int(x.strip()) for x in CYCLE_LIMIT_RAW.split(",") if x.strip()] if CYCLE_LIMIT_RAW else [])
+# "N" or "N,M" (e.g. CYCLE_LIMIT=50,50); anything else disables the limit
+_CYCLE_LIMIT_RE = re.compile(r"\s*(\d+)(?:\s*,\s*(\d+))?\s*")
+_cycle_match = _CYCLE_LIMIT_RE.fullmatch(CYCLE_LIMIT_RAW)
+CYCLE_LIMIT = [int(g) for g in _cycle_match.groups() if g] if _cycle_match else []
+if CYCLE_LIMIT_RAW.strip() and not _cycle_match:
+    logger.warning("Ignoring malformed CYCLE_LIMIT=%r (expected N or N,M)", CYCLE_LIMIT_RAW)
+
+
+@dataclass(frozen=True, slots=True)
+class Config:
+    """Trading config snapshot used on the per-trade path (same values as the globals above)."""
+    dry_run: bool
+    daily_capital_usd: float
+    max_buys_per_day: int
+    buy_fee_percent: float
+    sell_fee_percent: float
+    stop_loss: float
+    take_profit: float
+    trade_sleep_sec: float
+    sol_mint: str
+    swap_dry_run: bool  # DRY_RUN as the swap helpers read it (int, default on)
+    buy_net_usd_micros: int  # daily capital net of the buy fee, integer micro-USD
+
+
+CFG = Config(
+    dry_run=DRY_RUN,
+    daily_capital_usd=DAILY_CAPITAL_USD,
+    max_buys_per_day=MAX_BUYS_PER_DAY,
+    buy_fee_percent=BUY_FEE_PERCENT,
+    sell_fee_percent=SELL_FEE_PERCENT,
+    stop_loss=STOP_LOSS,
+    take_profit=TAKE_PROFIT,
+    trade_sleep_sec=TRADE_SLEEP_SEC,
+    sol_mint=utils.WSOL_MINT,
+    swap_dry_run=bool(utils.DRY_RUN),
+    buy_net_usd_micros=utils.net_of_fee_micros(DAILY_CAPITAL_USD, BUY_FEE_PERCENT),
+)
+
+# ---------- Wallet ----------
+def _load_keypair(privkey: Optional[str]) -> tuple[Optional[Keypair], Optional[str]]:
+    """Decode PRIVATE_KEY (base58 or JSON byte array) → (keypair, pubkey str); (None, None) if unusable."""
+    if not privkey:
+        logger.error("No PRIVATE_KEY in environment — cannot sign transactions")
+        return None, None
+    try:
+        try:
+            kp = Keypair.from_bytes(base58.b58decode(privkey))
+        except Exception:
+            kp = Keypair.from_bytes(bytes(json.loads(privkey)))
+        return kp, str(kp.pubkey())
+    except Exception as e:
+        logger.error("Failed to load keypair from PRIVATE_KEY: %s", e)
+        return None, None
+
+_WALLET_KP, _WALLET_PUBKEY = _load_keypair(os.getenv("PRIVATE_KEY"))
+
+_decode_keypair = utils.decode_keypair
 
 # ---------- Helpers from utils ----------
 usd_to_sol = utils.usd_to_sol
 sol_to_usd = utils.sol_to_usd
+usd_to_lamports_at = utils.usd_to_lamports_at
+usd_micros_to_lamports_at = utils.usd_micros_to_lamports_at
+lamports_to_usd_at = utils.lamports_to_usd_at
 get_sol_price_usd = utils.get_sol_price_usd
+fetch_sol_price_usd = utils.fetch_sol_price_usd
 execute_jupiter_swap_from_quote = utils.execute_jupiter_swap_from_quote
 is_ca_processed = utils.is_ca_processed
 save_processed_ca = utils.save_processed_ca
@@ -89,28 +152,96 @@ detect_network_congestion = utils.detect_network_congestion
 send_telegram_message = utils.send_telegram_message
 extract_contract_address = utils.extract_contract_address
 enqueue_ca = utils.enqueue_ca
-dequeue_ca = utils.dequeue_ca
+dequeue_cas = utils.dequeue_cas
 sleep_with_logging = utils.sleep_with_logging
+backoff_delay = utils.backoff_delay
 format_coin_name = utils.format_coin_name
+fmt_usd = utils.fmt_usd
 get_market_cap_or_priceinfo = utils.get_market_cap_or_priceinfo
+get_dexscreener_data = utils.get_dexscreener_data
 fetch_token_price_and_mcap = utils.fetch_token_price_and_mcap
 fetch_json = getattr(utils, "fetch_json", None)  # compatibility if available
 
 # ---------- State ----------
-SOL_MINT = "So11111111111111111111111111111111111111112"
-LAMPORTS_PER_SOL = 1_000_000_000
-_pending_cas: asyncio.Queue = asyncio.Queue()
-daily_trades = 0
-_last_cycle_date = date.today()
+SOL_MINT = utils.WSOL_MINT
+LAMPORTS_PER_SOL = utils.LAMPORTS_PER_SOL
+_pending_cas: asyncio.PriorityQueue = asyncio.PriorityQueue()  # newest CA first, bounded in utils.enqueue_ca
+_tg_queue: asyncio.Queue = asyncio.Queue()  # outgoing trade notifications, drained by _tg_sender
+_tg_held: list[str] = []  # taken off _tg_queue but not yet sent
+TG_BATCH_SEC = float(os.environ.get("TG_BATCH_SEC", "2"))
+TG_MAX_LEN = 4096  # Telegram sendMessage text limit
+TG_SEND_RETRIES = 5
+MAX_CONCURRENT_TRADES = int(os.environ.get("MAX_CONCURRENT_TRADES", "1"))
+_trade_semaphore = asyncio.Semaphore(MAX_CONCURRENT_TRADES)
+_ca_locks: defaultdict[str, asyncio.Lock] = defaultdict(asyncio.Lock)
+CA_BATCH_MAX = int(os.environ.get("CA_BATCH_MAX", "8"))
+PREFETCH_DEPTH = int(os.environ.get("PREFETCH_DEPTH", "4"))
+PENDING_CA_MAX_AGE_SEC = utils.PENDING_CA_MAX_AGE_SEC
+PREFETCH_MAX_AGE_SEC = float(os.environ.get("PREFETCH_MAX_AGE_SEC", "10"))
+_prefetch_semaphore = asyncio.Semaphore(PREFETCH_DEPTH)
+
+
+class DailyCounter:
+    """
+    Trades completed today (UTC, like daily_reset_loop). Rolls over lazily on
+    access by comparing ordinal days, so no reset task has to fire on time. All access is from the event
+    loop with no await in between, so it needs no lock.
+    """
+
+    __slots__ = ("day", "count")
+
+    def __init__(self):
+        self.day = datetime.now(timezone.utc).date().toordinal()
+        self.count = 0
+
+    def roll(self) -> bool:
+        """Reset on a new day; True if a reset happened."""
+        today = datetime.now(timezone.utc).date().toordinal()
+        if today == self.day:
+            return False
+        self.day, self.count = today, 0
+        return True
+
+    def incr(self) -> int:
+        self.roll()
+        self.count += 1
+        return self.count
+
+    def value(self) -> int:
+        self.roll()
+        return self.count
+
+
+daily_trades = DailyCounter()
 BALANCE_FILE = "balance.json"
 current_usd_balance = None
 
 # ---------- Telegram client ----------
 client = TelegramClient(SESSION_NAME, API_ID, API_HASH)
+# Hot-path constants for _on_new_message, built once
+_LEAD_WS_RE = re.compile(r"^[\s\u200B\u200C\u200D\uFEFF]+")
+
+
+async def async_antiflood(fn, *args, retries: int = 5, **kwargs):
+    """
+    Await a Telethon call, sleeping out FloodWaitError instead of failing.
+    The wait doubles on repeated floods; the final attempt raises.
+    """
+    delay = 0
+    for attempt in range(retries - 1):
+        try:
+            return await fn(*args, **kwargs)
+        except FloodWaitError as e:
+            delay = max(e.seconds + 1, delay * 2)
+            logger.warning("FloodWait on %s: sleeping %ss (%d/%d)", getattr(fn, "__name__", fn), delay, attempt + 1, retries)
+            await asyncio.sleep(delay)
+    return await fn(*args, **kwargs)
+
 @client.on(events.NewMessage(chats=TARGET_CHANNEL_ID))
 async def _on_new_message(event):
     """
     Robust Telegram handler:
+      - drops messages without any 🔥 before doing any other work
       - logs raw message
       - cleans leading invisible chars
       - ensures the message is a '🔥' pick (either first char of first line or present in first line)
@@ -121,175 +252,300 @@ async def _on_new_message(event):
     try:
         msg = event.message
         # best raw text extraction Telethon provides
-        raw_text = getattr(event, "raw_text", None) or getattr(msg, "text", "") or getattr(msg, "message", "") or ""
+        try:
+            raw_text = event.raw_text or msg.text or msg.message or ""
+        except AttributeError:
+            raw_text = getattr(event, "raw_text", None) or getattr(msg, "text", "") or getattr(msg, "message", "") or ""
+        # Cheap gate first: anything without a 🔥 anywhere can never be a pick
+        if "🔥" not in raw_text:
+            logger.debug("No 🔥 in message, skipping")
+            return
         logger.info("📩 Raw incoming Telegram message (repr): %r", raw_text)
         # Clean leading zero-width/invisible whitespace then strip
-        cleaned = re.sub(r'^[\s\u200B\u200C\u200D\uFEFF]+', '', raw_text).strip() if raw_text else ""
-        logger.debug("Cleaned text (first 200 chars): %s", cleaned[:200])
+        cleaned = _LEAD_WS_RE.sub("", raw_text, count=1).strip() if raw_text else ""
         if not cleaned:
             logger.debug("Message contained no text after cleaning, skipping")
             return
-        first_line = cleaned.splitlines()[0] if cleaned.splitlines() else cleaned
-        first_char = first_line[0] if first_line else ""
-        try:
-            logger.debug("First char: %r (U+%04X)", first_char, ord(first_char) if first_char else 0)
-        except Exception:
-            logger.debug("First char: %r", first_char)
-        # Skip messages starting with 📈 ,💰 or 🏆 (these are not new CA posts)
-        if first_char in ("📈", "💰", "🏆"):
-            logger.info("Skipping message due to first character: %s", first_char)
-            return
-        # Accept messages that either start with 🔥 or contain 🔥 on the first line
-        if not (first_line.startswith("🔥") or "🔥" in first_line):
-            logger.debug("Message does not start with or contain a leading 🔥, skipping")
-            return
-        # Use the extractor (which prefers buttons then text)
-        res = extract_contract_address(msg)
-        logger.debug("extract_contract_address -> %s", res)
-        if not res or not res.get("ca"):
-            # Try to give more diagnostics if possible
-            diagnostics = {
-                "buttons_present": False,
-                "buttons_have_urls": False,
-                "buttons_url_matched": False,
-                "text_has_ca_pattern": False,
-            }
-            try:
-                buttons = getattr(msg, "buttons", None) or []
-                if buttons:
-                    diagnostics["buttons_present"] = True
-                    for row in buttons:
-                        for btn in row:
-                            url = getattr(btn, "url", "") or ""
-                            if url:
-                                diagnostics["buttons_have_urls"] = True
-                                if re.search(r"([1-9A-HJ-NP-Za-km-z]{32,44})(?:pump|bonk)?", url):
-                                    diagnostics["buttons_url_matched"] = True
-                                    break
-                        if diagnostics["buttons_url_matched"]:
-                            break
-                text = getattr(msg, "text", "") or getattr(msg, "message", "") or ""
-                if text and re.search(r"([1-9A-HJ-NP-Za-km-z]{32,44})(?:pump|bonk)?", text):
-                    diagnostics["text_has_ca_pattern"] = True
-            except Exception:
-                pass
-            logger.warning("Could not extract contract address from message; diagnostics=%s", diagnostics)
-            return
-        ca = res["ca"]
-        if is_ca_processed(ca):
-            logger.info("CA already processed, skipping: %s", ca)
-            return
+        first_line = cleaned.partition('\n')[0]
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Cleaned text (first 200 chars): %s", cleaned[:200])
+            logger.debug("First char: %r (U+%04X)", first_line[0], ord(first_line[0]))
+        # Route on the first character; other messages count as picks only with 🔥 on the first line
+        handler = _FIRST_CHAR_DISPATCH.get(first_line[:1])
+        if handler is None:
+            handler = _handle_pick if "🔥" in first_line else _skip_no_fire
+        await handler(msg, first_line)
+    except Exception as e:
+        logger.exception("Error in _on_new_message: %s", e)
+
+
+async def _skip_first_char(msg, first_line: str):
+    # 📈 ,💰 and 🏆 posts are updates, not new CA posts
+    logger.info("Skipping message due to first character: %s", first_line[0])
+
+
+async def _skip_no_fire(msg, first_line: str):
+    logger.debug("Message does not start with or contain a leading 🔥, skipping")
+
+
+async def _handle_pick(msg, first_line: str):
+    """A 🔥 pick: extract the CA (buttons, then text) and enqueue it."""
+    # Use the extractor (which prefers buttons then text)
+    res = extract_contract_address(msg)
+    logger.debug("extract_contract_address -> %s", res)
+    if not res or not res.get("ca"):
+        # the extractor already walked the buttons and text; just report why it failed
+        logger.warning("Could not extract contract address from message; reason=%s", (res or {}).get("reason"))
+        return
+    ca = res["ca"]
+    if is_ca_processed(ca):
+        logger.info("CA already processed, skipping: %s", ca)
+        return
+    allowed = True
+    try:
+        allowed = is_buy_allowed()
+    except Exception:
         allowed = True
+    if not allowed:
+        logger.info("Buys not allowed currently by cycle settings - saving CA and skipping: %s", ca)
         try:
-            allowed = is_buy_allowed()
+            save_processed_ca(ca)
         except Exception:
-            allowed = True
-        if not allowed:
-            logger.info("Buys not allowed currently by cycle settings - saving CA and skipping: %s", ca)
-            try:
-                save_processed_ca(ca)
-            except Exception:
-                logger.warning("Failed to save processed CA %s", ca)
-            return
-        await enqueue_ca(_pending_cas, ca)
-        logger.info("✅     Enqueued CA for processing: %s", ca)
-    except Exception as e:
-        logger.exception("Error in _on_new_message: %s", e)
+            logger.warning("Failed to save processed CA %s", ca)
+        return
+    await enqueue_ca(_pending_cas, ca)
+    logger.info("✅     Enqueued CA for processing: %s", ca)
+
+
+_FIRST_CHAR_DISPATCH = {
+    "📈": _skip_first_char,
+    "💰": _skip_first_char,
+    "🏆": _skip_first_char,
+    "🔥": _handle_pick,
+}
 
 # ---------Token_name----------
-def resolve_token_name(ca: str) -> str:
-    """Simple fallback resolver for token name."""
+TOKEN_NAME_TTL_SEC = 300.0
+_token_name_cache: dict[str, tuple[float, str]] = {}
+
+async def resolve_token_name(ca: str) -> str:
+    """
+    Simple fallback resolver for token name (cached per CA for TOKEN_NAME_TTL_SEC).
+    Reads the same cached Dexscreener payload as the price lookup, so a
+    prefetch costs one request rather than two.
+    """
+    now = time.monotonic()
+    hit = _token_name_cache.get(ca)
+    if hit and now - hit[0] < TOKEN_NAME_TTL_SEC:
+        return hit[1]
+    name = ca[:8]
     try:
-        import requests
-        url = f"https://api.dexscreener.com/latest/dex/tokens/{ca}"
-        resp = requests.get(url, timeout=10)
-        data = resp.json()
+        data = await utils.fetch_dexscreener_token(ca) or {}
         pairs = data.get("pairs")
-        if pairs and isinstance(pairs, list):
-            first = pairs[0]
-            return first.get("baseToken", {}).get("symbol") or first.get("baseToken", {}).get("name") or ca[:8]
+        base = pairs[0].get("baseToken") if isinstance(pairs, list) and pairs and isinstance(pairs[0], dict) else None
+        found = (base.get("symbol") or base.get("name")) if isinstance(base, dict) else None
+        if found:
+            name = found
+            # only cache names Dexscreener actually returned; the ca[:8] fallback is retried next time
+            if len(_token_name_cache) >= 1024:
+                for k in [k for k, (ts, _) in _token_name_cache.items() if now - ts >= TOKEN_NAME_TTL_SEC]:
+                    del _token_name_cache[k]
+            _token_name_cache[ca] = (now, name)
     except Exception:
         pass
-    return ca[:8]
+    return name
 # ---------- Trade execution & processing ----------
-async def process_pending_cas():
+def _tg_chunks(msgs):
     """
-    Background worker: processes CAs from _pending_cas queue → buy → monitor → sell.
-    - Applies filters (price, liquidity, mcap/liq ratio, sell tax)
-    - Executes BUY via Jupiter Ultra
-    - Sends Telegram BUY message
-    - Spawns monitor_position()
-    - On sell: sends matching SELL Telegram message
+    Join messages with blank lines into texts of at most TG_MAX_LEN chars once
+    MarkdownV2-escaped by send_telegram_message (an oversized message goes alone).
     """
-    global daily_trades
+    batch, size = [], 0
+    for m in msgs:
+        n = utils.telegram_text_len(m)
+        if batch and size + n > TG_MAX_LEN:
+            yield "\n\n".join(batch)
+            batch, size = [], 0
+        batch.append(m)
+        size += n + 2
+    if batch:
+        yield "\n\n".join(batch)
+
+
+def _send_tg_text(text: str) -> bool:
     try:
-        privkey = os.getenv("PRIVATE_KEY")
-        if not privkey:
-            logger.error("No PRIVATE_KEY in environment — cannot sign transactions")
-            return
+        return send_telegram_message(text)
+    except Exception as e:
+        logger.warning("Telegram notification failed: %s", e)
+        return False
 
-        # === Derive keypair & pubkey ===
-        try:
-            from solders.keypair import Keypair
-            import base58
-            try:
-                kp = Keypair.from_bytes(base58.b58decode(privkey))
-            except Exception:
-                arr = json.loads(privkey)
-                kp = Keypair.from_bytes(bytes(arr))
-            pubkey = str(kp.pubkey())
-            wallet = kp  # for signing
-        except Exception as e:
-            logger.exception("Failed to load keypair from PRIVATE_KEY: %s", e)
-            return
 
-        async with aiohttp.ClientSession() as session:
-            position_active = False
+async def _tg_sender():
+    """
+    Coalesce notifications: wait TG_BATCH_SEC after the first one, then send
+    everything queued as few sendMessage calls as possible, off the event loop.
+    A failed send keeps its text at the head of _tg_held and is retried with
+    backoff; after TG_SEND_RETRIES failures in a row it is dropped.
+    """
+    failures = 0
+    while True:
+        if not _tg_held:
+            _tg_held.append(await _tg_queue.get())
+            await asyncio.sleep(TG_BATCH_SEC)
+        while not _tg_queue.empty():
+            _tg_held.append(_tg_queue.get_nowait())
+        if not utils.telegram_enabled():
+            _tg_held.clear()  # nowhere to send; don't spin on retries
+            continue
+        text, *rest = _tg_chunks(_tg_held)
+        # taken out before the send so a cancellation mid-send can't resend it
+        _tg_held[:] = rest
+        if await asyncio.to_thread(_send_tg_text, text):
+            failures = 0
+            continue
+        failures += 1
+        if failures >= TG_SEND_RETRIES:
+            logger.error("Dropping Telegram notification after %d failed sends: %.200s", failures, text)
+            failures = 0
+            continue
+        _tg_held.insert(0, text)
+        await asyncio.sleep(backoff_delay(failures, base=1.0, cap=30.0))
+
+
+def _take_tg_pending() -> list[str]:
+    """
+    Empty _tg_held and _tg_queue into a list (shutdown path). Loop thread
+    only: asyncio.Queue is not thread-safe, so drain here and hand the list
+    to _send_tg_pending in a thread.
+    """
+    while not _tg_queue.empty():
+        _tg_held.append(_tg_queue.get_nowait())
+    pending = list(_tg_held)
+    _tg_held.clear()
+    return pending
+
+
+def _send_tg_pending(pending: list[str]):
+    """Synchronously send already-drained notifications in batched chunks (safe in a thread)."""
+    for text in _tg_chunks(pending):
+        _send_tg_text(text)
+
+_BUY_FMT = (
+    "✅ BUY executed\n"
+    "Coin: {0}\n"
+    "CA: `{1}`\n"
+    "Price: ${2:.8f}\n"
+    "MCAP: {3}\n"
+    "Amount (net): ${4:.2f}\n"
+    "Fee: ${5:.2f}\n"
+    "Amount (gross): ${6:.2f}\n"
+    "TX: [View](https://solscan.io/tx/{7})"
+)
+_SELL_FMT = (
+    "🟥 SELL executed\n"
+    "Coin: {0}\n"
+    "CA: `{1}`\n"
+    "Price: ${2:.8f}\n"
+    "MCAP: {3}\n"
+    "Amount (out): ${4:.2f}\n"
+    "Fee: ${5:.2f}\n"
+    "Profit: ${6:+.2f}\n"
+    "TX: [View](https://solscan.io/tx/{7})"
+)
+
+def parse_token_info(token_info) -> tuple[float, Optional[float], Optional[float], str]:
+    """
+    (mcap, price_usd, supply, source) from get_market_cap_or_priceinfo's tuple
+    or a raw info dict, normalised once here: mcap is always a float, price and
+    supply are float or None. Anything else counts as "no info"; the prefetch
+    result is not refetched here.
+    """
+    if isinstance(token_info, (list, tuple)) and len(token_info) >= 4:
+        mcap, price, supply, source = token_info[:4]
+    elif isinstance(token_info, dict):
+        mcap = token_info.get("marketCap")
+        price = token_info.get("priceUsd")
+        supply = token_info.get("circulatingSupply")
+        source = token_info.get("source")
+    else:
+        return 0.0, None, None, "none"
+    return _parse_number(mcap) or 0.0, _parse_number(price), _parse_number(supply), source or "none"
 
-            while True:
-                ca = await dequeue_ca(_pending_cas)
-                if not ca:
-                    await sleep_with_logging(1.0, "No CA in queue, waiting...")
-                    continue
 
-                if position_active:
-                    logger.info(f"Active trade in progress — skipping CA {ca}")
-                    continue
+async def _prefetch_ca(ca: str):
+    """
+    Fetch everything the filters need for a CA concurrently.
+    Returns (token_info, (liquidity_usd, volume_usd, sell_tax), coin_name).
+    """
+    async with _prefetch_semaphore:
+        return await asyncio.gather(
+            get_market_cap_or_priceinfo(ca),
+            get_dexscreener_data(ca),
+            resolve_token_name(ca),
+        )
 
-                position_active = True
-                logger.info(f"Processing CA {ca}...")
 
+async def _process_ca(session: aiohttp.ClientSession, ca: str, enqueued_at: float, wallet: Keypair, pubkey: str):
+    """
+    Full lifecycle for a single CA: filters → BUY → Telegram → monitor → SELL.
+    Runs as its own task; concurrency is bounded by _trade_semaphore and a CA
+    already in flight is skipped via its per-CA lock. A CA that waited longer
+    than PENDING_CA_MAX_AGE_SEC (since enqueue) for a trade slot is dropped.
+    """
+    lock = _ca_locks[ca]
+    prefetch = None
+    if lock.locked():
+        logger.info(f"CA {ca} already in flight — skipping duplicate")
+        return
+    try:
+        async with lock:
+            if is_ca_processed(ca):
+                logger.info("CA already processed, skipping: %s", ca)
+                return
+            # Fetch market data while waiting for a trade slot
+            prefetch = asyncio.create_task(_prefetch_ca(ca))
+            prefetch_started = time.monotonic()
+            async with _trade_semaphore:
+                age = time.monotonic() - enqueued_at
+                if age > PENDING_CA_MAX_AGE_SEC:
+                    logger.info("Dropping stale CA %s (waited %.1fs for a trade slot)", ca, age)
+                    return
+                logger.info(f"Processing CA {ca}...")
+                cooldown = True
                 try:
-                    # === Fetch token info ===
-                    token_info = await get_market_cap_or_priceinfo(ca)
+                    # === Token info + Dexscreener data (prefetched) ===
+                    token_info, dex_data, coin_name = await prefetch
+                    if time.monotonic() - prefetch_started > PREFETCH_MAX_AGE_SEC:
+                        logger.debug("Prefetched data for %s is stale — refetching", ca)
+                        token_info, dex_data, coin_name = await _prefetch_ca(ca)
                     mcap_val, price_usd, supply, price_source = parse_token_info(token_info)
-                    coin_name = resolve_token_name(ca)
-
-                    # === Dexscreener data ===
-                    liquidity_usd, volume_usd, sell_tax = await get_dexscreener_data(ca)
+                    liquidity_usd, volume_usd, sell_tax = dex_data
 
                     # === Log summary ===
+                    # parse_token_info / get_dexscreener_data already return floats (price may be None)
+                    price_f = price_usd or 0.0
                     logger.info(
                         "CA %s | %s | Price=%.8f | MCAP=$%.2f | Liq=$%.2f | Vol=$%.2f | src=%s",
-                        ca[:8], coin_name, price_usd or 0, mcap_val, liquidity_usd, volume_usd, price_source
+                        ca[:8], coin_name, price_f, mcap_val, liquidity_usd, volume_usd, price_source
                     )
 
                     # === Filters ===
                     if not await passes_filters(ca, price_usd, mcap_val, liquidity_usd, sell_tax):
                         save_processed_ca(ca)
-                        continue
+                        return
 
                     # === Trade amount ===
-                    usd_net = DAILY_CAPITAL_USD * (1.0 - BUY_FEE_PERCENT / 100)
-                    sol_lamports = int(usd_to_sol(usd_net) * 1e9)
+                    usd_net = CFG.buy_net_usd_micros / utils.MICRO_USD
+                    sol_price = await fetch_sol_price_usd(session)
+                    sol_lamports = usd_micros_to_lamports_at(CFG.buy_net_usd_micros, sol_price)
                     if sol_lamports <= 0:
                         logger.warning("Zero lamports for buy — skipping %s", ca)
                         save_processed_ca(ca)
-                        continue
+                        return
 
                     # === Execute BUY ===
                     quote = {
-                        "inputMint": SOL_MINT,
+                        "inputMint": CFG.sol_mint,
                         "outputMint": ca,
                         "inAmount": sol_lamports,
                     }
@@ -299,7 +555,8 @@ async def process_pending_cas():
                         quote=quote,
                         privkey=wallet,
                         pubkey=pubkey,
-                        fee_percent=BUY_FEE_PERCENT,
+                        payer_privkey=wallet,  # same PRIVATE_KEY, already decoded
+                        fee_percent=CFG.buy_fee_percent,
                         coin_name=coin_name,
                         market_cap=mcap_val,
                     )
@@ -307,13 +564,15 @@ async def process_pending_cas():
                     if not tx_sig or tx_sig.startswith("DRY_RUN"):
                         logger.warning("BUY failed or dry-run — skipping monitor for %s", ca)
                         save_processed_ca(ca)
-                        continue
+                        return
 
                     # === Record & Notify ===
-                    fee_usd = usd_net * BUY_FEE_PERCENT / 100
+                    fee_usd = usd_net * CFG.buy_fee_percent / 100
                     usd_gross = usd_net + fee_usd
 
-                    record_buy(
+                    # file write off the loop so the monitor starts without waiting on disk
+                    await asyncio.to_thread(
+                        record_buy,
                         ca=ca,
                         coin_name=coin_name,
                         market_cap=mcap_val,
@@ -323,18 +582,10 @@ async def process_pending_cas():
                         priority_fee_sol=0,
                     )
 
-                    buy_msg = (
-                        f"✅ BUY executed\n"
-                        f"Coin: {coin_name}\n"
-                        f"CA: `{ca}`\n"
-                        f"Price: ${price_usd:.8f}\n"
-                        f"MCAP: ${mcap_val:,.2f}\n"
-                        f"Amount (net): ${usd_net:.2f}\n"
-                        f"Fee: ${fee_usd:.2f}\n"
-                        f"Amount (gross): ${usd_gross:.2f}\n"
-                        f"TX: [View](https://solscan.io/tx/{tx_sig})"
+                    buy_msg = _BUY_FMT.format(
+                        coin_name, ca, price_f, fmt_usd(mcap_val), usd_net, fee_usd, usd_gross, tx_sig
                     )
-                    send_telegram_message(buy_msg)
+                    _tg_queue.put_nowait(buy_msg)
                     logger.info("Buy executed: CA=%s, tx=%s", ca, tx_sig)
 
                     # === Spawn monitor (with sell callback) ===
@@ -353,38 +604,223 @@ async def process_pending_cas():
                     # === On sell: send mirrored message ===
                     if sell_tx and not sell_tx.startswith("DRY_RUN"):
                         sell_out_usd = await estimate_sell_value(ca, sol_lamports, session)
-                        sell_fee_usd = sell_out_usd * SELL_FEE_PERCENT / 100
+                        sell_fee_usd = sell_out_usd * CFG.sell_fee_percent / 100
                         profit_usd = sell_out_usd - usd_net
 
-                        sell_msg = (
-                            f"🟥 SELL executed\n"
-                            f"Coin: {coin_name}\n"
-                            f"CA: `{ca}`\n"
-                            f"Price: ${price_usd:.8f}\n"
-                            f"MCAP: ${mcap_val:,.2f}\n"
-                            f"Amount (out): ${sell_out_usd:.2f}\n"
-                            f"Fee: ${sell_fee_usd:.2f}\n"
-                            f"Profit: ${profit_usd:+.2f}\n"
-                            f"TX: [View](https://solscan.io/tx/{sell_tx})"
+                        sell_msg = _SELL_FMT.format(
+                            coin_name, ca, price_f, fmt_usd(mcap_val), sell_out_usd, sell_fee_usd, profit_usd, sell_tx
                         )
-                        send_telegram_message(sell_msg)
+                        _tg_queue.put_nowait(sell_msg)
                         logger.info("Sell executed: CA=%s, tx=%s, profit=$%.2f", ca, sell_tx, profit_usd)
 
-                    daily_trades += 1
+                    daily_trades.incr()
                     save_processed_ca(ca)
 
+                except asyncio.CancelledError:
+                    cooldown = False  # shutting down: no post-trade pause
+                    raise
                 except Exception as e:
                     logger.exception("Error processing CA %s: %s", ca, e)
                 finally:
-                    position_active = False
-                    await sleep_with_logging(TRADE_SLEEP_SEC, f"Post-trade cooldown {TRADE_SLEEP_SEC}s")
+                    if cooldown:
+                        await sleep_with_logging(CFG.trade_sleep_sec, f"Post-trade cooldown {CFG.trade_sleep_sec}s")
+    except Exception as e:
+        # nothing may escape a trade task: it must not take the worker or other trades down
+        logger.exception("Trade task for %s failed: %s", ca, e)
+    finally:
+        if prefetch is not None and not prefetch.done():
+            prefetch.cancel()
+        _ca_locks.pop(ca, None)
+
+
+async def process_pending_cas(session: aiohttp.ClientSession):
+    """
+    Background worker: pulls CAs from the _pending_cas queue and runs each
+    through _process_ca as its own task (buy → monitor → sell).
+    - Applies filters (price, liquidity, mcap/liq ratio, sell tax)
+    - Executes BUY via Jupiter Ultra
+    - Sends Telegram BUY message
+    - Spawns monitor_position()
+    - On sell: sends matching SELL Telegram message
+    At most MAX_CONCURRENT_TRADES positions are open at once, and at most
+    PREFETCH_DEPTH more CAs wait (prefetching) for a slot; everything else
+    stays in _pending_cas, where the cap, newest-first order and age limit apply.
+    `session` is the process-wide pooled session created in main().
+    """
+    try:
+        if _WALLET_KP is None:
+            logger.error("No usable PRIVATE_KEY — cannot sign transactions")
+            return
+        wallet, pubkey = _WALLET_KP, _WALLET_PUBKEY
+
+        max_inflight = MAX_CONCURRENT_TRADES + PREFETCH_DEPTH
+        inflight: set[asyncio.Task] = set()
+        try:
+            while True:
+                if len(inflight) >= max_inflight:
+                    await asyncio.wait(inflight, return_when=asyncio.FIRST_COMPLETED)
+                    continue
+                # wakes as soon as a CA arrives and picks up as much of the burst as there is room for
+                room = min(CA_BATCH_MAX, max_inflight - len(inflight))
+                for enqueued_at, ca in await dequeue_cas(_pending_cas, room):
+                    task = asyncio.create_task(_process_ca(session, ca, enqueued_at, wallet, pubkey))
+                    inflight.add(task)
+                    task.add_done_callback(inflight.discard)
+        finally:
+            # cancelling the worker cancels and awaits every in-flight trade;
+            # trades are independent, so one failing never cancels the others
+            pending = list(inflight)
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
 
     except Exception as e:
         logger.exception("process_pending_cas crashed: %s", e)
 # ---------- Part 2 will continue with monitor_position, daily cycle, balance, main loop ----------
+# ============================================================
+# BATCHED PRICE ORACLE
+# ============================================================
+# One task polls every CA under monitor with a single Dexscreener call per
+# tick; monitors read the latest snapshot instead of fetching individually.
+_watched_cas: set[str] = set()
+_oracle_prices: dict[str, dict] = {}
+_oracle_task: Optional[asyncio.Task] = None
+
+
+async def _price_oracle_loop(session: aiohttp.ClientSession, interval: float):
+    while _watched_cas:
+        cas = list(_watched_cas)
+        now = time.monotonic()
+        for i in range(0, len(cas), utils.DEXSCREENER_BATCH_MAX):
+            try:
+                batch = await utils.fetch_token_prices_batch(session, cas[i:i + utils.DEXSCREENER_BATCH_MAX])
+            except Exception as e:
+                logger.debug("Price oracle batch failed: %s", e)
+                continue
+            for ca, info in batch.items():
+                info["ts"] = now
+                _oracle_prices[ca] = info
+        await asyncio.sleep(interval)
+
+
+def _watch_ca(session: aiohttp.ClientSession, ca: str, interval: float):
+    """Register ca with the price oracle, (re)starting the oracle task if idle."""
+    global _oracle_task
+    _watched_cas.add(ca)
+    if _oracle_task is None or _oracle_task.done():
+        _oracle_task = asyncio.create_task(_price_oracle_loop(session, interval))
+
+
+def _unwatch_ca(ca: str):
+    _watched_cas.discard(ca)
+    _oracle_prices.pop(ca, None)
+
+
+class PriceBatcher:
+    """
+    Coalesces direct price lookups issued within `window` seconds into one
+    Dexscreener batch call; CAs missing from the batch fall back to the
+    per-CA fetch_token_price_and_mcap (itself TTL-cached and single-flight).
+    """
+
+    def __init__(self, window: float = 0.1):
+        self.window = window
+        self._pending: dict[str, asyncio.Future] = {}
+        self._flushes: set[asyncio.Task] = set()  # strong refs; one per open or in-flight window
+
+    async def get(self, session: aiohttp.ClientSession, ca: str) -> dict:
+        fut = self._pending.get(ca)
+        if fut is None:
+            if not self._pending:
+                # first CA of a new window gets its own flush, even while an
+                # earlier window's batch request is still in flight
+                task = asyncio.create_task(self._flush_soon(session))
+                self._flushes.add(task)
+                task.add_done_callback(self._flushes.discard)
+            fut = self._pending[ca] = asyncio.get_running_loop().create_future()
+        info = await asyncio.shield(fut)
+        return info if info is not None else await fetch_token_price_and_mcap(ca)
+
+    async def _flush_soon(self, session: aiohttp.ClientSession):
+        await asyncio.sleep(self.window)
+        pending, self._pending = self._pending, {}
+        cas = list(pending)
+        results: dict[str, dict] = {}
+        try:
+            for i in range(0, len(cas), utils.DEXSCREENER_BATCH_MAX):
+                results.update(await utils.fetch_token_prices_batch(session, cas[i:i + utils.DEXSCREENER_BATCH_MAX]))
+        except Exception as e:
+            logger.debug("Price batcher flush failed: %s", e)
+        finally:
+            now = time.monotonic()
+            for ca, fut in pending.items():
+                info = results.get(ca)
+                if info is not None:
+                    info["ts"] = now
+                    _oracle_prices[ca] = info
+                if not fut.done():
+                    fut.set_result(info)
+
+
+PRICE_BATCHER = PriceBatcher()
+
+
+async def _get_price_info(session: aiohttp.ClientSession, ca: str, interval: float) -> dict:
+    """Latest oracle snapshot for ca; batched direct fetch if missing or older than 3 ticks."""
+    _watch_ca(session, ca, interval)
+    info = _oracle_prices.get(ca)
+    if info and time.monotonic() - info["ts"] <= 3 * interval:
+        return info
+    return await PRICE_BATCHER.get(session, ca)
+
+
 # ============================================================
 # PRICE MONITOR FUNCTION (fixed & improved)
 # ============================================================
+def _safe_float_env(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, str(default)))
+    except (TypeError, ValueError):
+        logger.warning("Invalid %s=%r; using %s", name, os.getenv(name), default)
+        return default
+
+
+# SL/TP as positive percentages, plus the poll cadence, read once at import
+STOP_LOSS_PCT = abs(STOP_LOSS)
+TAKE_PROFIT_PCT = abs(TAKE_PROFIT)
+MONITOR_POLL_SEC = _safe_float_env("MONITOR_POLL_SEC", 2.4)
+MONITOR_MAX_BACKOFF_SEC = 15.0
+# ±% spread on every monitor sleep so positions don't poll in lockstep (0 disables)
+MONITOR_JITTER_PCT = _safe_float_env("MONITOR_JITTER_PCT", 20.0)
+_NUM_STRIP_RE = re.compile(r"[^0-9eE.\-]")
+# price-info keys in preference order; the fetchers already return floats, so
+# _parse_number only does real work for odd string-valued payloads
+_PRICE_KEYS = ("priceUsd", "price", "priceUSD")
+_MCAP_KEYS = ("marketCap", "market_cap", "mcap", "marketCapUsd")
+
+
+def _jittered(seconds: float, rng: random.Random) -> float:
+    if MONITOR_JITTER_PCT <= 0:
+        return seconds
+    spread = MONITOR_JITTER_PCT / 100.0
+    return seconds * rng.uniform(1.0 - spread, 1.0 + spread)
+
+
+def _parse_number(val):
+    """Try to coerce a value (string or number) into float, stripping $ and commas."""
+    if val is None:
+        return None
+    if isinstance(val, (int, float)):
+        return float(val)
+    s = _NUM_STRIP_RE.sub("", str(val).strip())
+    if s == "":
+        return None
+    try:
+        return float(s)
+    except Exception:
+        return None
+
+
 async def monitor_position(
     session: aiohttp.ClientSession,
     ca: str,
@@ -405,106 +841,88 @@ async def monitor_position(
      - persist entry_mcap if missing (best-effort)
      - clearer logging
     """
-    def _safe_float_env(name: str, default: float) -> float:
-        try:
-            return float(os.getenv(name, str(default)))
-        except (TypeError, ValueError):
-            return default
-
-    def _fmt_amt(x: float) -> str:
-        try:
-            return f"{float(x):.8f}"
-        except Exception:
-            return str(x)
-
-    def _parse_number(val):
-        """Try to coerce a value (string or number) into float, stripping $ and commas."""
-        if val is None:
-            return None
-        if isinstance(val, (int, float)):
-            return float(val)
-        s = str(val).strip()
-        s = re.sub(r"[^0-9eE\.\-]", "", s)
-        if s == "":
-            return None
-        try:
-            return float(s)
-        except Exception:
-            return None
-
-    # normalize stop-loss and take-profit to positive percentages
-    stop_loss_pct = abs(_safe_float_env("STOP_LOSS", 20.0))
-    take_profit_pct = abs(_safe_float_env("TAKE_PROFIT", 40.0))
-    poll_interval = _safe_float_env("MONITOR_POLL_SEC", 2.4)
-    sell_fee_pct = _safe_float_env("SELL_FEE_PERCENT", 1.0)
-
+    stop_loss_pct = STOP_LOSS_PCT
+    take_profit_pct = TAKE_PROFIT_PCT
+    poll_interval = MONITOR_POLL_SEC
+    misses = 0  # consecutive polls without usable price data
+    rng = random.Random(ca)  # per-CA stream so monitors desynchronise
+    # history record fields parsed once per record, not once per poll
+    parsed_rec = None
+    rec_usd_in = rec_entry_mcap = None
+    sell_fee_pct = SELL_FEE_PERCENT
+
+    entry_str = f"{entry_price:.8f}" if isinstance(entry_price, (int, float)) else str(entry_price)
+    # thresholds are fixed for the life of the position: derive them once
+    try:
+        entry_f = float(entry_price) if entry_price else 0.0
+    except (TypeError, ValueError):
+        entry_f = 0.0
+    tp_mult = 1.0 + take_profit_pct / 100.0
+    sl_mult = 1.0 - stop_loss_pct / 100.0
+    net_fee_mult = 1.0 - sell_fee_pct / 100.0
+    bounds_mcap = tp_mcap = sl_mcap = None  # mcap TP/SL levels, derived once entry_mcap is known
     logger.info(
         "📈 Started monitor for %s | entry=%s | src=%s | SL=%.2f%% | TP=%.2f%% | SELL_FEE=%.2f%%",
-        ca, _fmt_amt(entry_price), price_source, stop_loss_pct, take_profit_pct, sell_fee_pct,
+        ca, entry_str, price_source, stop_loss_pct, take_profit_pct, sell_fee_pct,
     )
 
-    # helper to locate the most recent history record for this CA with usd_in and no usd_out yet
-    async def _find_history_record_for_ca(ca_val):
-        async with SIM_LOCK:
-            for rec in reversed(SIM_STATE.get("history", [])):
-                if rec.get("ca") == ca_val and rec.get("usd_in") is not None and rec.get("usd_out") is None:
-                    return rec
-        return None
-
     try:
         while True:
-            info = await fetch_token_price_and_mcap(ca)
+            info = await _get_price_info(session, ca, poll_interval)
 
             # normalize/resilient reads
             raw_price = None
             raw_mcap = None
             if isinstance(info, dict):
-                raw_price = info.get("priceUsd") or info.get("price") or info.get("priceUsd")
-                raw_mcap = info.get("marketCap") or info.get("market_cap") or info.get("mcap") or info.get("marketCapUsd")
+                raw_price = next((v for k in _PRICE_KEYS if (v := info.get(k))), None)
+                raw_mcap = next((v for k in _MCAP_KEYS if (v := info.get(k))), None)
             current_price = _parse_number(raw_price)
             current_mcap = _parse_number(raw_mcap)
             current_source = (info.get("source") if isinstance(info, dict) else getattr(info, "source", None)) or "unknown"
 
-            # Log numeric values (debug)
-            logger.debug(
-                "Monitor poll for %s | price=%s | mcap=%s | src=%s",
-                ca,
-                (f"{current_price:.8f}" if current_price is not None else "N/A"),
-                (f"{current_mcap:.2f}" if current_mcap is not None else "N/A"),
-                current_source,
-            )
+            debug = logger.isEnabledFor(logging.DEBUG)
+            if debug:
+                logger.debug(
+                    "Monitor poll for %s | price=%s | mcap=%s | src=%s",
+                    ca,
+                    (f"{current_price:.8f}" if current_price is not None else "N/A"),
+                    (f"{current_mcap:.2f}" if current_mcap is not None else "N/A"),
+                    current_source,
+                )
 
-            # no useful data yet
+            # no useful data yet: back off exponentially (capped) until the feed recovers
             if (current_price is None or current_price <= 0.0) and current_mcap is None:
-                await asyncio.sleep(poll_interval)
+                misses += 1
+                await asyncio.sleep(_jittered(min(poll_interval * (1.5 ** misses), MONITOR_MAX_BACKOFF_SEC), rng))
                 continue
+            misses = 0
 
             # compute price change from entry (guard against zero entry_price)
-            pct_from_entry = 0.0
-            try:
-                if entry_price and float(entry_price) > 0:
-                    pct_from_entry = (( (current_price or 0.0) - float(entry_price)) / float(entry_price)) * 100.0
-            except Exception:
-                pct_from_entry = 0.0
-
-            logger.debug(
-                "Monitor %s: price=%s entry=%s Δ(entry)=%+.2f%% (src=%s) mcap=%s",
-                ca,
-                (f"{current_price:.8f}" if current_price is not None else "N/A"),
-                _fmt_amt(entry_price),
-                pct_from_entry,
-                current_source,
-                (f"{current_mcap:.2f}" if current_mcap is not None else "N/A"),
-            )
+            pct_from_entry = ((current_price or 0.0) - entry_f) / entry_f * 100.0 if entry_f > 0 else 0.0
+
+            if debug:
+                logger.debug(
+                    "Monitor %s: price=%s entry=%s Δ(entry)=%+.2f%% (src=%s) mcap=%s",
+                    ca,
+                    (f"{current_price:.8f}" if current_price is not None else "N/A"),
+                    entry_str,
+                    pct_from_entry,
+                    current_source,
+                    (f"{current_mcap:.2f}" if current_mcap is not None else "N/A"),
+                )
 
             # DRY_RUN simulation path
             if DRY_RUN:
-                rec = await _find_history_record_for_ca(ca)
+                rec = OPEN_POSITIONS_BY_CA.get(ca)  # latest open history record (usd_in, no usd_out)
                 usd_in = None
                 entry_mcap = None
                 if rec:
-                    usd_in = _parse_number(rec.get("usd_in"))
-                    entry_mcap = _parse_number(rec.get("entry_mcap"))
+                    if rec is not parsed_rec:
+                        parsed_rec = rec
+                        rec_usd_in = _parse_number(rec.get("usd_in"))
+                        rec_entry_mcap = _parse_number(rec.get("entry_mcap"))
+                    usd_in = rec_usd_in
+                    entry_mcap = rec_entry_mcap
                 else:
                     # fallback to passed usd_amount_net
                     try:
@@ -520,10 +938,9 @@ async def monitor_position(
                 # If we have a history record but no entry_mcap, persist current_mcap as entry_mcap (best-effort)
                 if rec and entry_mcap is None and current_mcap is not None:
                     try:
-                        async with SIM_LOCK:
-                            rec["entry_mcap"] = float(current_mcap)
+                        rec["entry_mcap"] = float(current_mcap)
                         await save_sim_state()
-                        entry_mcap = float(current_mcap)
+                        entry_mcap = rec_entry_mcap = float(current_mcap)
                         logger.debug("DRY_RUN: set missing entry_mcap for %s -> %s", ca, entry_mcap)
                     except Exception:
                         pass
@@ -531,8 +948,10 @@ async def monitor_position(
                 # Decide outcome: prefer mcap-based decision if both known AND thresholds crossed
                 outcome = None
                 if (entry_mcap is not None) and (current_mcap is not None):
-                    tp_mcap = entry_mcap * (1.0 + (take_profit_pct / 100.0))
-                    sl_mcap = entry_mcap * (1.0 - (stop_loss_pct / 100.0))
+                    if entry_mcap != bounds_mcap:
+                        bounds_mcap = entry_mcap
+                        tp_mcap = entry_mcap * tp_mult
+                        sl_mcap = entry_mcap * sl_mult
                     if current_mcap >= tp_mcap:
                         outcome = "TP"
                     elif current_mcap <= sl_mcap:
@@ -542,9 +961,9 @@ async def monitor_position(
 
                 # Only consider price thresholds when mcap decision unavailable
                 if outcome is None:
-                    if pct_from_entry >= abs(take_profit_pct):
+                    if pct_from_entry >= take_profit_pct:
                         outcome = "TP"
-                    elif pct_from_entry <= -abs(stop_loss_pct):
+                    elif pct_from_entry <= -stop_loss_pct:
                         outcome = "SL"
 
                 # If outcome decided, compute returns & update SIM_STATE
@@ -553,27 +972,24 @@ async def monitor_position(
                     if usd_in is None:
                         usd_in = float(entry_price) if entry_price else 0.0
 
-                    if outcome == "TP":
-                        gross_return = usd_in * (1.0 + (take_profit_pct / 100.0))
-                    else:  # SL
-                        gross_return = usd_in * (1.0 - (stop_loss_pct / 100.0))
-
-                    net_return = gross_return * (1.0 - (sell_fee_pct / 100.0))
+                    gross_return = usd_in * (tp_mult if outcome == "TP" else sl_mult)
+                    net_return = gross_return * net_fee_mult
 
                     # update SIM_STATE (history + counters + balance)
-                    async with SIM_LOCK:
-                        if rec:
-                            rec["usd_out"] = float(net_return)
-                            rec["exit_price"] = float(current_price) if current_price is not None else None
-                            rec["result"] = "WIN" if outcome == "TP" else "LOSS"
-                            rec["timestamp_exit"] = datetime.utcnow().isoformat() + "Z"
-                        SIM_STATE["completed_trades"] = SIM_STATE.get("completed_trades", 0) + 1
-                        if outcome == "TP":
-                            SIM_STATE["wins"] = SIM_STATE.get("wins", 0) + 1
-                        else:
-                            SIM_STATE["losses"] = SIM_STATE.get("losses", 0) + 1
-                        # add the returned USD back to balance (buy already deducted usd_in at buy-time)
-                        SIM_STATE["balance"] = SIM_STATE.get("balance", 0.0) + float(net_return)
+                    if rec:
+                        OPEN_POSITIONS_BY_CA.pop(ca, None)
+                        rec["usd_out"] = float(net_return)
+                        rec["exit_price"] = float(current_price) if current_price is not None else None
+                        rec["result"] = "WIN" if outcome == "TP" else "LOSS"
+                        rec["timestamp_exit"] = datetime.utcnow().isoformat() + "Z"
+                        _record_pct(rec)
+                    SIM_STATE["completed_trades"] = SIM_STATE.get("completed_trades", 0) + 1
+                    if outcome == "TP":
+                        SIM_STATE["wins"] = SIM_STATE.get("wins", 0) + 1
+                    else:
+                        SIM_STATE["losses"] = SIM_STATE.get("losses", 0) + 1
+                    # add the returned USD back to balance (buy already deducted usd_in at buy-time)
+                    SIM_STATE["balance"] = SIM_STATE.get("balance", 0.0) + float(net_return)
 
                     await save_sim_state()
 
@@ -590,8 +1006,7 @@ async def monitor_position(
                     )
 
                     # send summary if we've reached daily cap
-                    async with SIM_LOCK:
-                        buys = SIM_STATE.get("buys_today", 0)
+                    buys = SIM_STATE.get("buys_today", 0)
                     if buys >= MAX_BUYS_PER_DAY:
                         try:
                             await send_simulation_summary()
@@ -601,11 +1016,11 @@ async def monitor_position(
                     break  # stop monitoring after simulated sell
 
                 # continue polling if no outcome yet
-                await asyncio.sleep(poll_interval)
+                await asyncio.sleep(_jittered(poll_interval, rng))
                 continue
 
             # REAL execution path
-            if pct_from_entry <= -abs(stop_loss_pct):
+            if pct_from_entry <= -stop_loss_pct:
                 logger.info("⛔ Stop-Loss triggered for %s (%.2f%%). Selling...", ca, pct_from_entry)
                 await execute_sell(
                     session=session,
@@ -617,7 +1032,7 @@ async def monitor_position(
                 )
                 break
 
-            if pct_from_entry >= abs(take_profit_pct):
+            if pct_from_entry >= take_profit_pct:
                 logger.info("🎯 Take-Profit triggered for %s (%.2f%%). Selling...", ca, pct_from_entry)
                 await execute_sell(
                     session=session,
@@ -629,29 +1044,27 @@ async def monitor_position(
                 )
                 break
 
-            await asyncio.sleep(poll_interval)
+            await asyncio.sleep(_jittered(poll_interval, rng))
 
     except asyncio.CancelledError:
         logger.info("Monitor cancelled for %s", ca)
+        raise  # let the owning trade task unwind too
     except Exception as e:
         logger.exception("Error in monitor for %s: %s", ca, e)
     finally:
+        _unwatch_ca(ca)
         logger.info("Monitor finished for %s", ca)
 # ---------- Daily cycle & balance helpers ----------
 def reset_daily_cycle():
-    global daily_trades, _last_cycle_date
-    today = date.today()
-    if today != _last_cycle_date:
+    if daily_trades.roll():
         logger.info("Resetting daily cycle counters for new day")
-        daily_trades = 0
-        _last_cycle_date = today
 
 
 def load_balance():
     global current_usd_balance
     try:
-        with open(BALANCE_FILE, "r") as f:
-            data = json.load(f)
+        with open(BALANCE_FILE, "rb") as f:
+            data = orjson.loads(f.read())
             current_usd_balance = data.get("usd_balance", DAILY_CAPITAL_USD)
     except Exception:
         current_usd_balance = DAILY_CAPITAL_USD
@@ -660,14 +1073,12 @@ def load_balance():
 def save_balance():
     global current_usd_balance
     try:
-        with open(BALANCE_FILE, "w") as f:
-            json.dump({"usd_balance": current_usd_balance}, f, indent=2)
+        with open(BALANCE_FILE, "wb") as f:
+            f.write(orjson.dumps({"usd_balance": current_usd_balance}, option=orjson.OPT_INDENT_2))
     except Exception as e:
         logger.warning("Failed to save balance: %s", e)
 
-# --- Simulation / DRY_RUN state (add near top, after imports) ---
-DRY_RUN = os.getenv("DRY_RUN", "0").lower() in ("1", "true", "yes")
-
+# --- Simulation / DRY_RUN state ---
 # path to persist sim state
 SIM_STATE_PATH = os.path.join(os.path.dirname(__file__), "sim_state.json")
 
@@ -682,8 +1093,72 @@ SIM_STATE = {
     "buys_today": 0,
     "history": [],  # each entry: dict with keys below
 }
+# Guards load/snapshot only: in-loop SIM_STATE updates contain no await, so they
+# are already atomic with respect to other tasks and need no lock.
 SIM_LOCK = asyncio.Lock()
-MAX_BUYS_PER_DAY = int(os.getenv("MAX_BUYS_PER_DAY", "50"))
+# ca -> most recent history record with usd_in and no usd_out yet (rebuilt on load)
+OPEN_POSITIONS_BY_CA: dict[str, dict] = {}
+
+
+class RunningMedian:
+    """Streaming median: max-heap of the lower half (negated) + min-heap of the upper half.
+    Also keeps a running sum so mean() is O(1)."""
+
+    def __init__(self):
+        self.lo: list[float] = []
+        self.hi: list[float] = []
+        self.total = 0.0
+        self.count = 0
+
+    def push(self, x: float):
+        self.total += x
+        self.count += 1
+        if self.lo and x > -self.lo[0]:
+            heapq.heappush(self.hi, x)
+        else:
+            heapq.heappush(self.lo, -x)
+        if len(self.lo) > len(self.hi) + 1:
+            heapq.heappush(self.hi, -heapq.heappop(self.lo))
+        elif len(self.hi) > len(self.lo):
+            heapq.heappush(self.lo, -heapq.heappop(self.hi))
+
+    def median(self) -> float:
+        if not self.lo:
+            return 0.0
+        if len(self.lo) > len(self.hi):
+            return -self.lo[0]
+        return (-self.lo[0] + self.hi[0]) / 2.0
+
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+
+# median/mean % return over closed history records, for send_simulation_summary
+RUNNING_PCT = RunningMedian()
+
+
+def _record_pct(rec: dict):
+    usd_in = rec.get("usd_in")
+    usd_out = rec.get("usd_out")
+    if usd_in is None or usd_out is None or usd_in == 0:
+        return
+    RUNNING_PCT.push(((usd_out - usd_in) / usd_in) * 100.0)
+
+
+def _rebuild_open_positions():
+    global RUNNING_PCT
+    OPEN_POSITIONS_BY_CA.clear()
+    RUNNING_PCT = RunningMedian()
+    for rec in SIM_STATE.get("history", []):  # later records win, as the old reverse scan did
+        if rec.get("ca") and rec.get("usd_in") is not None and rec.get("usd_out") is None:
+            OPEN_POSITIONS_BY_CA[rec["ca"]] = rec
+        else:
+            _record_pct(rec)
+
+
+def _read_json_bytes(path: str):
+    with open(path, "rb") as f:
+        return orjson.loads(f.read())
 
 
 async def load_sim_state():
@@ -691,60 +1166,81 @@ async def load_sim_state():
     global SIM_STATE
     try:
         if os.path.exists(SIM_STATE_PATH):
-            with open(SIM_STATE_PATH, "r") as f:
-                data = json.load(f)
+            data = await asyncio.to_thread(_read_json_bytes, SIM_STATE_PATH)
             async with SIM_LOCK:
                 # merge but preserve keys
                 SIM_STATE.update(data)
+                _rebuild_open_positions()
             logger.info("Loaded simulation state from %s", SIM_STATE_PATH)
     except Exception as e:
         logger.warning("Failed to load SIM_STATE: %s", e)
 
 
+SIM_SAVE_COALESCE_SEC = 2.0
+_sim_dirty = asyncio.Event()
+
+
 async def save_sim_state():
-    """Persist SIM_STATE to disk (atomic write)."""
+    """Mark SIM_STATE for persistence; _sim_flusher coalesces the actual writes."""
+    _sim_dirty.set()
+
+
+def _atomic_write(path: str, data: bytes):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+async def _sim_flusher():
+    """Background task: at most one compact SIM_STATE write per SIM_SAVE_COALESCE_SEC, off the loop."""
+    while True:
+        await _sim_dirty.wait()
+        await asyncio.sleep(SIM_SAVE_COALESCE_SEC)
+        _sim_dirty.clear()
+        try:
+            async with SIM_LOCK:
+                snapshot = orjson.dumps(SIM_STATE)
+            await asyncio.to_thread(_atomic_write, SIM_STATE_PATH, snapshot)
+        except Exception as e:
+            _sim_dirty.set()
+            logger.warning("Failed to save SIM_STATE: %s", e)
+
+
+def flush_sim_state():
+    """Write any unsaved SIM_STATE now, pretty-printed (shutdown path)."""
+    if not _sim_dirty.is_set():
+        return
     try:
-        async with SIM_LOCK:
-            tmp = SIM_STATE.copy()
-        tmp_path = SIM_STATE_PATH + ".tmp"
-        with open(tmp_path, "w") as f:
-            json.dump(tmp, f, indent=2)
-        os.replace(tmp_path, SIM_STATE_PATH)
+        _atomic_write(SIM_STATE_PATH, orjson.dumps(SIM_STATE, option=orjson.OPT_INDENT_2))
+        _sim_dirty.clear()
     except Exception as e:
         logger.warning("Failed to save SIM_STATE: %s", e)
 
 
+atexit.register(flush_sim_state)
+
+
 async def send_simulation_summary():
     """
     Compose and send a DRY_RUN daily summary via your send_telegram_message helper.
-    Includes median return (percent) computed across completed trades.
+    Includes median and mean return (percent) across completed trades, read
+    from RUNNING_PCT in O(1) rather than rescanning history.
     """
     try:
-        async with SIM_LOCK:
-            start = SIM_STATE.get("starting_balance", 0.0)
-            end = SIM_STATE.get("balance", 0.0)
-            wins = SIM_STATE.get("wins", 0)
-            losses = SIM_STATE.get("losses", 0)
-            completed = SIM_STATE.get("completed_trades", 0)
-            buys = SIM_STATE.get("buys_today", 0)
-            history = list(SIM_STATE.get("history", []))
+        start = SIM_STATE.get("starting_balance", 0.0)
+        end = SIM_STATE.get("balance", 0.0)
+        wins = SIM_STATE.get("wins", 0)
+        losses = SIM_STATE.get("losses", 0)
+        completed = SIM_STATE.get("completed_trades", 0)
+        buys = SIM_STATE.get("buys_today", 0)
+        # history entries with 'usd_in' and 'usd_out' (net after fees) feed RUNNING_PCT
+        median_pct = RUNNING_PCT.median()
+        mean_pct = RUNNING_PCT.mean()
 
         total = wins + losses
         win_rate = (wins / total * 100.0) if total > 0 else 0.0
 
-        # Build list of percent returns for median calculation.
-        # Each history entry should include 'usd_in' and 'usd_out' (net after fees)
-        pct_returns = []
-        for rec in history:
-            usd_in = rec.get("usd_in")
-            usd_out = rec.get("usd_out")
-            if usd_in is None or usd_out is None or usd_in == 0:
-                continue
-            pct = ((usd_out - usd_in) / usd_in) * 100.0
-            pct_returns.append(pct)
-
-        median_pct = float(statistics.median(pct_returns)) if pct_returns else 0.0
-
         msg = (
             f"📊 *DRY_RUN Daily Simulation Summary*\n"
             f"🧪 Starting Balance: ${start:.2f}\n"
@@ -753,33 +1249,51 @@ async def send_simulation_summary():
             f"✅ Wins: {wins} | ❌ Losses: {losses}\n"
             f"📈 Win rate: {win_rate:.2f}%\n"
             f"📉 Median return per trade: {median_pct:.2f}%\n"
+            f"➗ Mean return per trade: {mean_pct:.2f}%\n"
             f"🔁 Completed simulated trades: {completed}"
         )
-        # send_telegram_message is assumed to be synchronous in your codebase;
-        # if it's async, replace call with await send_telegram_message(msg)
+        # send_telegram_message is synchronous and may sleep out a 429 flood
+        # wait, so it runs in a thread rather than stalling every monitor
         try:
-            send_telegram_message(msg)
+            await asyncio.to_thread(send_telegram_message, msg)
         except Exception:
             logger.exception("Failed to send DRY_RUN summary via send_telegram_message")
     except Exception as e:
         logger.exception("Failed to prepare DRY_RUN summary: %s", e)
 
 #---- Dry Run Reset
+# set (e.g. via SIGUSR1) to force the daily reset now instead of at 00:00 UTC
+cycle_reset_event = asyncio.Event()
+
+
 async def daily_reset_loop():
     while True:
         # compute seconds until next 00:00 UTC
-        now = datetime.utcnow()
-        tomorrow = (now.replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=1))
+        now = datetime.now(timezone.utc)
+        tomorrow = (now + timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0)
         seconds = (tomorrow - now).total_seconds()
-        await asyncio.sleep(seconds)
-        async with SIM_LOCK:
-            SIM_STATE["buys_today"] = 0
-            # optionally keep history or move to archived file
+        # wait_for times out on the loop's monotonic clock; the event allows an early wake
+        try:
+            await asyncio.wait_for(cycle_reset_event.wait(), timeout=seconds)
+            logger.info("Daily reset triggered early by signal")
+        except asyncio.TimeoutError:
+            pass
+        cycle_reset_event.clear()
+        SIM_STATE["buys_today"] = 0
+        # optionally keep history or move to archived file
         await save_sim_state()
 
 # ============================================================
 # SELL EXECUTION FUNCTION
 # ============================================================
+# opens after 5 straight transport/5xx/408/429 failures on /execute; retries stop for 30s
+JUPITER_BREAKER = utils.CircuitBreaker("Jupiter /execute")
+# 4xx codes that mean "try again later" rather than "this payload is bad"
+_TRANSIENT_HTTP_STATUS = frozenset((408, 429))
+# mint -> decimals; immutable per mint, so cached for the life of the process
+_token_decimals: dict[str, int] = {}
+
+
 async def execute_sell(
     session: aiohttp.ClientSession,
     token_mint: str,
@@ -799,42 +1313,23 @@ async def execute_sell(
     - Use payer_privkey for small swaps (<$15) to bypass gasless minimum.
     - Sets referralFeeBps=0 to disable referral fees.
     """
-    DRY_RUN = bool(int(os.getenv("DRY_RUN", "1")))
-    total_fee_pct = total_fee_pct or float(os.getenv("SELL_FEE_PERCENT", "0"))
-    # Load payer_privkey from env if not provided
-    payer_privkey = payer_privkey or os.getenv("PRIVATE_KEY")
-    # Fetch SOL/USD price from Jupiter Ultra API
-    async def fetch_sol_usd_price() -> float:
-        PRICE_URL = "https://lite-api.jup.ag/price/v3?ids=So11111111111111111111111111111111111111112"
-        try:
-            async with session.get(PRICE_URL, timeout=10) as r:
-                data = await r.json()
-                sol_key = "So11111111111111111111111111111111111111112"
-                if sol_key in data and "usdPrice" in data[sol_key]:
-                    price = float(data[sol_key]["usdPrice"])
-                    logger.info(f"💵 Live SOL price: ${price:.2f}")
-                    return price
-                else:
-                    logger.error(f"❌  Invalid SOL price response: {data}")
-                    return 150.0  # Fallback price
-        except Exception as e:
-            logger.error(f"❌  Failed to fetch SOL price: {e}")
-            return 150.0  # Fallback price
-    SOL_USD_PRICE = await fetch_sol_usd_price()
-    if SOL_USD_PRICE == 150.0:
-        logger.warning(f"⚠️ Using fallback SOL price: ${SOL_USD_PRICE:.2f}")
-    wallet = privkey if isinstance(privkey, Keypair) else Keypair.from_base58_string(privkey.strip())
-    logger.info(f"🟡 Preparing SELL for {token_mint} | Fee={total_fee_pct:.2f}% | DRY_RUN={DRY_RUN}")
+    dry_run = CFG.swap_dry_run
+    total_fee_pct = total_fee_pct or CFG.sell_fee_percent
+    # Fall back to PRIVATE_KEY as payer if not provided
+    payer_privkey = payer_privkey or _WALLET_KP  # PRIVATE_KEY, decoded once at import
+    # Fetch SOL/USD price from Jupiter Price API
+    SOL_USD_PRICE = await fetch_sol_price_usd(session)
+    wallet = privkey if isinstance(privkey, Keypair) else _decode_keypair(privkey)
+    logger.info(f"🟡 Preparing SELL for {token_mint} | Fee={total_fee_pct:.2f}% | DRY_RUN={dry_run}")
     payer_wallet = None
     if payer_privkey:
         try:
-            payer_wallet = payer_privkey if isinstance(payer_privkey, Keypair) else Keypair.from_base58_string(payer_privkey.strip())
+            payer_wallet = payer_privkey if isinstance(payer_privkey, Keypair) else _decode_keypair(payer_privkey)
         except Exception as e:
             logger.error(f"❌  Failed to load payer wallet keypair: {e}")
             return None
     ORDER_URL = "https://lite-api.jup.ag/ultra/v1/order"
     EXEC_URL = "https://lite-api.jup.ag/ultra/v1/execute"
-    wallet = privkey if isinstance(privkey, Keypair) else Keypair.from_base58_string(privkey.strip())
 
     # ✅ Fetch the actual token balance before creating the order
     try:
@@ -842,7 +1337,9 @@ async def execute_sell(
         if not ui_amount or ui_amount <= 0:
             logger.warning(f"⚠️ No balance found for {token_mint}. Skipping SELL.")
             return None
-        decimals = await get_token_decimals(token_mint)
+        decimals = _token_decimals.get(token_mint)
+        if decimals is None:
+            decimals = _token_decimals[token_mint] = await get_token_decimals(token_mint)
         position_balance_lamports = int(float(ui_amount) * (10 ** decimals))
         logger.debug(f"📊 Updated sell amount to actual wallet balance: {position_balance_lamports} lamports")
     except Exception as e:
@@ -851,7 +1348,7 @@ async def execute_sell(
 
     params = {
         "inputMint": token_mint,
-        "outputMint": "So11111111111111111111111111111111111111112",
+        "outputMint": CFG.sol_mint,
         "amount": str(position_balance_lamports),
         "taker": pubkey,
     }
@@ -875,13 +1372,12 @@ async def execute_sell(
             text = await r.text()
             logger.error(f"❌  Non-JSON response from /order: {text} (Status: {r.status})")
             return None
-        order = await r.json()
+        order = await r.json(loads=orjson.loads)
     if not order.get("transaction"):
         logger.error(f"❌  Invalid order response for {token_mint}: {order}")
         return None
-    est_out_sol = int(order["outAmount"]) / 1e9
-    out_usd = est_out_sol * SOL_USD_PRICE
-    fee_usd = out_usd * (total_fee_pct / 100.0)
+    out_usd = lamports_to_usd_at(int(order["outAmount"]), SOL_USD_PRICE)
+    fee_usd = out_usd * total_fee_pct / 100.0
     # === Validate minimum amount for gasless transactions ===
     if out_usd < 15.0 and not payer_privkey:
         logger.error(f"❌  Swap output ${out_usd:.2f} is below $15 minimum for gasless transactions. Provide payer_privkey or set PRIVATE_KEY in env.")
@@ -898,11 +1394,11 @@ async def execute_sell(
     signed_tx = base64.b64encode(bytes(signed_tx_obj)).decode("utf-8")
     # =================================================
     # === DRY RUN ===
-    if DRY_RUN:
+    if dry_run:
         fake_tx = f"DRY_RUN_SELL_{int(time.time())}"
         try:
-            update_compound_balance(after_profit_usd=out_usd)
-            record_sell(
+            await asyncio.to_thread(
+                record_sell,
                 ca=token_mint,
                 coin_name=coin_name or "Unknown",
                 market_cap=market_cap or 0,
@@ -910,6 +1406,7 @@ async def execute_sell(
                 usd_amount_net=out_usd - fee_usd,
                 fee_usd=fee_usd,
                 priority_fee_sol=priority_fee_sol or 0,
+                proceeds_credit_usd=out_usd,
             )
             logger.info(f"✅  DRY_RUN SELL recorded for {token_mint}")
         except Exception as e:
@@ -918,17 +1415,35 @@ async def execute_sell(
     # === Real transaction ===
     payload = {"signedTransaction": signed_tx, "requestId": order["requestId"]}
     for attempt in range(1, 4):
+        if attempt > 1:
+            await asyncio.sleep(backoff_delay(attempt - 1))
+        # the first attempt always goes out: an SL/TP sell must not be skipped
+        # outright because other calls tripped the breaker
+        if attempt > 1 and not JUPITER_BREAKER.allow():
+            logger.error(f"❌  Jupiter circuit open — not retrying SELL for {token_mint}")
+            break
         try:
             async with session.post(EXEC_URL, json=payload, timeout=20) as resp:
+                status = resp.status
+                if status >= 500 or status in _TRANSIENT_HTTP_STATUS:
+                    JUPITER_BREAKER.failure()
+                    logger.warning(f"Attempt {attempt}/3: /execute returned HTTP {status}")
+                    continue
                 if resp.headers.get("Content-Type", "").startswith("text/plain"):
                     text = await resp.text()
-                    logger.error(f"❌  Non-JSON response from /execute: {text} (Status: {resp.status})")
+                    logger.error(f"❌  Non-JSON response from /execute: {text} (Status: {status})")
+                    if status >= 400:
+                        break  # client error: resending the same payload cannot succeed
                     continue
-                result = await resp.json()
+                result = await resp.json(loads=orjson.loads)
+            JUPITER_BREAKER.success()
+            if status >= 400 and result.get("status", "").lower() != "success":
+                logger.error(f"❌  /execute rejected SELL for {token_mint} (HTTP {status}): {result}")
+                break
             if result.get("status", "").lower() == "success":
                 sig = result.get("signature") or result.get("txid")
-                update_compound_balance(after_profit_usd=out_usd)
-                record_sell(
+                await asyncio.to_thread(
+                    record_sell,
                     ca=token_mint,
                     coin_name=coin_name or "Unknown",
                     market_cap=market_cap or 0,
@@ -936,34 +1451,49 @@ async def execute_sell(
                     usd_amount_net=out_usd - fee_usd,
                     fee_usd=fee_usd,
                     priority_fee_sol=priority_fee_sol or 0,
+                    proceeds_credit_usd=out_usd,
                 )
                 logger.info(f"🚀 SELL success | {coin_name or token_mint}")
                 logger.info(f"🔗 Solscan: https://solscan.io/tx/{sig}")
                 return sig
             else:
                 logger.warning(f"Attempt {attempt}/3 failed: {result}")
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            JUPITER_BREAKER.failure()
+            logger.warning(f"Attempt {attempt}/3 error: {e}")
         except Exception as e:
             logger.warning(f"Attempt {attempt}/3 error: {e}")
-            await asyncio.sleep(2 * attempt)
-    logger.error(f"❌  SELL failed after 3 retries for {token_mint}")
+    logger.error(f"❌  SELL failed for {token_mint}")
     return None
 # ============================================================
 # MAIN LOOP
 # ============================================================
-import psutil
 import sqlite3
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+_instance_lock_file = None  # held open for the life of the process
 
 # Single-instance check to prevent multiple bot instances
 def check_single_instance():
+    """Take an exclusive flock on the PID file; the OS drops it when the process exits."""
+    global _instance_lock_file
     pid_file = "/tmp/sniper_bot.pid"
-    if os.path.exists(pid_file):
-        with open(pid_file, "r") as f:
-            pid = int(f.read().strip())
-        if psutil.pid_exists(pid):
-            logger.error(f"Bot already running with PID {pid}. Exiting.")
+    f = open(pid_file, "a+")
+    if fcntl is not None:
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            f.seek(0)
+            logger.error(f"Bot already running with PID {f.read().strip() or '?'}. Exiting.")
             exit(1)
-    with open(pid_file, "w") as f:
-        f.write(str(os.getpid()))
+    f.seek(0)
+    f.truncate()
+    f.write(str(os.getpid()))
+    f.flush()
+    _instance_lock_file = f
 
 # ============================================================
 # MAIN LOOP
@@ -974,26 +1504,51 @@ async def main():
     load_balance()
     reset_daily_cycle()
     # Start Telegram client
-    await client.start(bot_token=TELEGRAM_BOT_TOKEN if TELEGRAM_BOT_TOKEN else None)
+    await async_antiflood(client.start, bot_token=TELEGRAM_BOT_TOKEN if TELEGRAM_BOT_TOKEN else None)
     logger.info("Telegram client started, listening for new messages...")
     # Background worker to process pending contract addresses
-    asyncio.create_task(process_pending_cas())
-    # Continuous watchdog for Telethon connection + main cycle
-    while True:
+    # One pooled session for the whole process; utils helpers reuse the same instance
+    session = utils.get_http_session()
+    worker = asyncio.create_task(process_pending_cas(session))
+    asyncio.create_task(utils.processed_ca_flusher())
+    tg_sender = asyncio.create_task(_tg_sender())
+    if DRY_RUN:
+        asyncio.create_task(daily_reset_loop())
+        asyncio.create_task(_sim_flusher())
         try:
-            # Run Telegram connection loop (keeps listening for CA messages)
-            await client.run_until_disconnected()
-        except Exception as e:
-            logger.warning(f"⚠️ Telethon disconnected: {e}, retrying in 10s...")
-            await asyncio.sleep(10)
-        finally:
-            # Maintain daily reset heartbeat even if Telethon reconnects
-            reset_daily_cycle()
-            await sleep_with_logging(60.0, "Main loop heartbeat, checking daily cycle")
+            asyncio.get_running_loop().add_signal_handler(signal.SIGUSR1, cycle_reset_event.set)
+        except (AttributeError, NotImplementedError):
+            pass  # no SIGUSR1 / signal handlers on this platform (e.g. Windows)
+    # Continuous watchdog for Telethon connection + main cycle
+    try:
+        while True:
+            try:
+                # Run Telegram connection loop (keeps listening for CA messages)
+                await client.run_until_disconnected()
+            except Exception as e:
+                logger.warning(f"⚠️ Telethon disconnected: {e}, retrying in 10s...")
+                await asyncio.sleep(10)
+            finally:
+                # Maintain daily reset heartbeat even if Telethon reconnects
+                reset_daily_cycle()
+                await sleep_with_logging(60.0, "Main loop heartbeat, checking daily cycle")
+    finally:
+        worker.cancel()
+        await asyncio.gather(worker, return_exceptions=True)
+        tg_sender.cancel()
+        await asyncio.gather(tg_sender, return_exceptions=True)
+        await asyncio.to_thread(_send_tg_pending, _take_tg_pending())
+        await utils.close_http_session()
 # ============================================================
 # ENTRY POINT
 # ============================================================
 if __name__ == "__main__":
+    try:
+        import uvloop  # optional: faster libuv-based event loop (not available on Windows)
+        uvloop.install()
+        logger.info("Using uvloop event loop")
+    except ImportError:
+        pass
     try:
         if DRY_RUN:
             # Load simulation state before running main
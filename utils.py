@@ -14,12 +14,19 @@ Features:
 - Compounding balance / DAILY_CAPITAL_USD handling
 """
 import asyncio
+import atexit
 import base64
 import base58
 import json
 import logging
+import functools
+import math
+import itertools
+import orjson
 from loguru import logger
 import os
+import random
+import threading
 import time
 import re
 import sys
@@ -76,8 +83,10 @@ PRIVATE_KEY_RAW = os.environ.get("PRIVATE_KEY", "")
 DRY_RUN = int(os.environ.get("DRY_RUN", "1"))  # 1 = simulate, 0 = live
 BUY_FEE_PERCENT = float(os.environ.get("BUY_FEE_PERCENT", "1.0"))
 SELL_FEE_PERCENT = float(os.environ.get("SELL_FEE_PERCENT", "1.0"))
+TOTAL_FEE_FRACTION = (BUY_FEE_PERCENT + SELL_FEE_PERCENT) / 100.0  # buy+sell, as a fraction
 TRADE_RECORD_FILE = os.environ.get("TRADE_RECORD_FILE", "trade_records.json")
 PROCESSED_CA_FILE = os.environ.get("PROCESSED_CA_FILE", "processed_cas.json")
+PROCESSED_CA_MAX = int(os.environ.get("PROCESSED_CA_MAX", "10000"))
 POSITION_STATE_FILE = os.environ.get("POSITION_STATE_FILE", "position_state.json")
 JUPITER_API_KEY = os.getenv("JUPITER_API_KEY", "")
 
@@ -86,18 +95,52 @@ LAMPORTS_PER_SOL = 1_000_000_000
 WSOL_MINT = os.environ.get("WSOL_MINT", "So11111111111111111111111111111111111111112")
 
 
+# MarkdownV2 reserved characters, escaped in one C-level translate pass
+_MDV2_ESCAPE = str.maketrans({c: "\\" + c for c in "_*[]()~`>#+-=|{}.!"})
+
 def _escape_markdown(text: str) -> str:
-    return re.sub(r'([_*[\]()~`>#+\-=|{}.!])', r'\\\1', text)
+    return text.translate(_MDV2_ESCAPE)
+
+def telegram_text_len(text: str) -> int:
+    """Length of text as send_telegram_message actually sends it (after MarkdownV2 escaping)."""
+    return len(_escape_markdown(text))
+
+def telegram_enabled() -> bool:
+    """True when a bot token and chat ID are configured for send_telegram_message."""
+    return bool(TELEGRAM_BOT_TOKEN and TELEGRAM_CHAT_ID)
+
+TELEGRAM_MAX_RETRIES = 3
+
+def telegram_post(url: str, post=requests.post, retries: int = TELEGRAM_MAX_RETRIES, **kwargs):
+    """
+    POST to the Telegram Bot API, honouring 429 flood limits.
+    Sleeps the server's retry_after (doubling it on repeated floods) and
+    retries up to `retries` times; returns the last response.
+    """
+    kwargs.setdefault("timeout", 15)
+    delay = 0.0
+    for attempt in range(retries + 1):
+        resp = post(url, **kwargs)
+        if resp.status_code != 429 or attempt == retries:
+            return resp
+        try:
+            retry_after = float(resp.json().get("parameters", {}).get("retry_after", 1))
+        except Exception:
+            retry_after = 1.0
+        delay = max(retry_after, delay * 2)
+        logger.warning("Telegram flood limit hit; retrying in %.1fs (%d/%d)", delay, attempt + 1, retries)
+        time.sleep(delay)
+    return resp
 
 def send_telegram_message(text: str) -> bool:
     """Send a MarkdownV2 message to configured Telegram chat (escaped)."""
-    if not TELEGRAM_BOT_TOKEN or not TELEGRAM_CHAT_ID:
+    if not telegram_enabled():
         logger.debug("Telegram token or chat ID not set; skipping message.")
         return False
     try:
         url = f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/sendMessage"
         safe_text = _escape_markdown(text)
-        resp = requests.post(
+        resp = telegram_post(
             url,
             data={
                 "chat_id": TELEGRAM_CHAT_ID,
@@ -117,26 +160,104 @@ def send_telegram_message(text: str) -> bool:
 # ---------- JSON helpers ----------
 def _load_json(file_path: str):
     try:
-        with open(file_path, "r") as f:
-            return json.load(f)
+        with open(file_path, "rb") as f:
+            return orjson.loads(f.read())
     except Exception:
         return {}
 
 def _save_json(file_path: str, data):
-    with open(file_path, "w") as f:
-        json.dump(data, f, indent=2)
+    # write-then-rename so a crash mid-write never leaves a truncated file
+    tmp_path = file_path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(orjson.dumps(data, option=orjson.OPT_INDENT_2))
+    os.replace(tmp_path, file_path)
 
 # ---------- Processed CA ----------
+# In-memory mirror of PROCESSED_CA_FILE (ca -> ISO timestamp), loaded on first use.
+# Kept in insertion order and capped at PROCESSED_CA_MAX, oldest evicted first.
+_processed_cas: Optional[dict] = None
+_processed_dirty = 0  # CAs saved in memory but not yet written
+PROCESSED_CA_FLUSH_SEC = 5.0
+PROCESSED_CA_FLUSH_MAX = 32
+_processed_flush_now = asyncio.Event()  # set once PROCESSED_CA_FLUSH_MAX are pending
+
+def _trim_processed_cas(processed: dict):
+    excess = len(processed) - PROCESSED_CA_MAX
+    if excess > 0:
+        for ca in list(itertools.islice(processed, excess)):
+            del processed[ca]
+
+def _get_processed_cas() -> dict:
+    global _processed_cas
+    if _processed_cas is None:
+        data = _load_json(PROCESSED_CA_FILE)
+        _processed_cas = data if isinstance(data, dict) else {}
+        _trim_processed_cas(_processed_cas)
+    return _processed_cas
+
 def is_ca_processed(ca: str) -> bool:
-    processed = _load_json(PROCESSED_CA_FILE)
-    return ca in processed
+    return ca in _get_processed_cas()
 
 def save_processed_ca(ca: str):
-    processed = _load_json(PROCESSED_CA_FILE)
+    """Mark ca processed in memory; the file is written in batches (see flush_processed_cas)."""
+    global _processed_dirty
+    processed = _get_processed_cas()
+    processed.pop(ca, None)  # re-insert so a re-seen CA counts as most recent
     processed[ca] = datetime.utcnow().isoformat()
-    _save_json(PROCESSED_CA_FILE, processed)
+    _trim_processed_cas(processed)
+    _processed_dirty += 1
+    if _processed_dirty >= PROCESSED_CA_FLUSH_MAX:
+        _processed_flush_now.set()  # wake processed_ca_flusher early; never write on the caller's path
+
+def flush_processed_cas():
+    """Write PROCESSED_CA_FILE now if there are unsaved CAs."""
+    global _processed_dirty
+    if not _processed_dirty or _processed_cas is None:
+        return
+    pending, _processed_dirty = _processed_dirty, 0
+    try:
+        _save_json(PROCESSED_CA_FILE, dict(_processed_cas))
+    except Exception as e:
+        _processed_dirty += pending
+        logger.warning("Failed to save processed CAs: %s", e)
+
+async def processed_ca_flusher():
+    """
+    Background task: writes processed CAs every PROCESSED_CA_FLUSH_SEC, or as
+    soon as PROCESSED_CA_FLUSH_MAX are pending. The file write runs in a thread.
+    """
+    global _processed_dirty
+    while True:
+        try:
+            await asyncio.wait_for(_processed_flush_now.wait(), PROCESSED_CA_FLUSH_SEC)
+        except asyncio.TimeoutError:
+            pass
+        _processed_flush_now.clear()
+        if not _processed_dirty or _processed_cas is None:
+            continue
+        pending, _processed_dirty = _processed_dirty, 0
+        snapshot = dict(_processed_cas)  # copied on the loop; the thread never sees the live dict
+        try:
+            await asyncio.to_thread(_save_json, PROCESSED_CA_FILE, snapshot)
+        except Exception as e:
+            _processed_dirty += pending
+            logger.warning("Failed to save processed CAs: %s", e)
+
+atexit.register(flush_processed_cas)
 
 # ---------- Position / compounding state ----------
+# Position state and trade records are read-modify-write JSON files. The
+# trade path writes them from worker threads (asyncio.to_thread), so every
+# writer holds this lock; re-entrant because record_sell updates the balance.
+_state_file_lock = threading.RLock()
+
+def _serialized(fn):
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        with _state_file_lock:
+            return fn(*args, **kwargs)
+    return wrapper
+
 def load_position_state() -> dict:
     state = _load_json(POSITION_STATE_FILE)
     if not state:
@@ -151,10 +272,12 @@ def load_position_state() -> dict:
 def save_position_state(state: dict):
     _save_json(POSITION_STATE_FILE, state)
 
+@_serialized
 def update_compound_balance(
     after_profit_usd: float | None = None,
     usd_in: float | None = None,
     usd_out: float | None = None,
+    balance_credit_usd: float | None = None,
 ) -> dict:
     """
     Update the compounding balance after *each* completed trade.
@@ -162,6 +285,10 @@ def update_compound_balance(
     Usage:
       - update_compound_balance(usd_in=29.70, usd_out=35.28)
       - update_compound_balance(after_profit_usd=+5.58)   # backward-compatible
+      - update_compound_balance(after_profit_usd=-2.10, balance_credit_usd=27.60)
+
+    balance_credit_usd is added to the balance only; last_trade_result and
+    last_profit_usd still reflect the trade's profit.
 
     Behavior:
       * Computes profit = usd_out - usd_in (or uses after_profit_usd if given)
@@ -192,17 +319,6 @@ def update_compound_balance(
     except Exception:
         daily_cap = 0.0
 
-    try:
-        buy_fee = float(BUY_FEE_PERCENT)
-    except Exception:
-        buy_fee = 0.0
-    try:
-        sell_fee = float(SELL_FEE_PERCENT)
-    except Exception:
-        sell_fee = 0.0
-
-    total_fee_pct = (buy_fee + sell_fee) / 100.0
-
     # --- reset tracking if daily cap changed ---
     if state.get("last_daily_capital") != daily_cap:
         logger.info(
@@ -243,13 +359,15 @@ def update_compound_balance(
 
     # add profit into the compounding balance
     try:
-        state["current_balance_usd"] = float(state["current_balance_usd"]) + float(profit or 0.0)
+        state["current_balance_usd"] = (
+            float(state["current_balance_usd"]) + float(profit or 0.0) + float(balance_credit_usd or 0.0)
+        )
     except Exception:
         # last resort: don’t crash the bot if file is malformed
-        state["current_balance_usd"] = float(profit or 0.0)
+        state["current_balance_usd"] = float(profit or 0.0) + float(balance_credit_usd or 0.0)
 
     # informational: how much fees will be reserved for a new cycle
-    state["reserved_fees_usd"] = float(daily_cap) * float(total_fee_pct)
+    state["reserved_fees_usd"] = daily_cap * TOTAL_FEE_FRACTION
 
     # meta fields
     state["cycle"] = int(state.get("cycle", 0)) + 1
@@ -273,6 +391,7 @@ def update_compound_balance(
     )
     return state
 # ---------- Trade records ----------
+@_serialized
 def record_buy(
     ca: str,
     coin_name: str,
@@ -319,6 +438,7 @@ def record_buy(
         priority_fee_sol,
     )
 
+@_serialized
 def record_sell(
     ca: str,
     coin_name: str,
@@ -328,12 +448,16 @@ def record_sell(
     priority_fee_sol: float,
     fee_usd: float | None = None,
     price_usd: float | None = None,
+    proceeds_credit_usd: float | None = None,
 ):
     """
     Save sell info to TRADE_RECORD_FILE.
     Stores both gross (before fees) and net (after fees) USD received,
     plus automatic profit/loss computation if matching buy info exists.
     Keeps priority fee for reporting and analytics.
+    proceeds_credit_usd is credited to the balance in the same compound-balance
+    update (as balance_credit_usd, so the stored result/profit stay the real
+    profit); callers don't need a second update_compound_balance() pass.
     """
     records = _load_json(TRADE_RECORD_FILE)
     timestamp = datetime.utcnow().isoformat()
@@ -385,13 +509,17 @@ def record_sell(
         (f"${profit:+.2f}" if profit is not None else "n/a"),
     )
 
-    # Update compound balance after a real or simulated sell
+    # Update compound balance after a real or simulated sell (single pass)
     try:
-        if profit is not None:
-            new_state = update_compound_balance(float(profit))
+        if profit is not None or proceeds_credit_usd:
+            new_state = update_compound_balance(
+                after_profit_usd=profit,
+                balance_credit_usd=proceeds_credit_usd,
+            )
             logger.info(
-                "🔁 Compound balance updated after SELL | profit=%+.2f | new_balance=%.6f | cycle=%d",
-                profit,
+                "🔁 Compound balance updated after SELL | profit=%+.2f | proceeds_credit=%.2f | new_balance=%.6f | cycle=%d",
+                float(profit or 0.0),
+                float(proceeds_credit_usd or 0.0),
                 new_state.get("current_balance_usd", 0.0),
                 new_state.get("cycle", 0),
             )
@@ -401,6 +529,12 @@ def record_sell(
 def md_code(text: str) -> str:
     return f"`{text}`"
 
+def fmt_usd(value) -> str:
+    """Whole-dollar amount (rounded) with thousands separators (int path, no float grouping); N/A for non-numbers and NaN/inf."""
+    if not isinstance(value, (int, float)) or not math.isfinite(value):
+        return "N/A"
+    return f"${int(round(value)):_}".replace("_", ",")
+
 def resolve_token_name(contract_address: str) -> str:
     return f"TKN_{contract_address[-6:]}" if contract_address else "N/A"
 
@@ -415,6 +549,37 @@ def safe_div(a, b):
     except Exception:
         return 0
 
+def backoff_delay(attempt: int, base: float = 0.25, cap: float = 4.0) -> float:
+    """Capped exponential backoff with 0.5x-1.5x jitter for retry number `attempt` (1-based)."""
+    return min(cap, base * (2 ** (attempt - 1))) * random.uniform(0.5, 1.5)
+
+class CircuitBreaker:
+    """
+    Fail fast while a dependency is down: after `threshold` consecutive
+    failures, allow() is False for `cooldown` seconds. The next call after
+    that is a probe; one more failure re-opens it, one success closes it.
+    """
+
+    def __init__(self, name: str, threshold: int = 5, cooldown: float = 30.0):
+        self.name = name
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.open_until = 0.0
+
+    def allow(self) -> bool:
+        return time.monotonic() >= self.open_until
+
+    def success(self):
+        self.failures = 0
+        self.open_until = 0.0
+
+    def failure(self):
+        self.failures += 1
+        if self.failures >= self.threshold:
+            self.open_until = time.monotonic() + self.cooldown
+            logger.warning("%s circuit open for %.0fs after %d failures", self.name, self.cooldown, self.failures)
+
 async def sleep_with_logging(seconds: float, reason: str = ""):
     if reason:
         logger.info("Sleeping %.2fs: %s", seconds, reason)
@@ -424,25 +589,92 @@ async def sleep_with_logging(seconds: float, reason: str = ""):
 async def _async_json_get(session: aiohttp.ClientSession, url: str, timeout: int = 10) -> Optional[dict]:
     try:
         async with session.get(url, timeout=timeout) as resp:
-            text = await resp.text()
-            try:
-                return json.loads(text)
-            except Exception:
-                try:
-                    return await resp.json()
-                except Exception as e:
-                    logger.debug("Failed to parse JSON from %s: %s", url, e)
-                    return None
+            body = await resp.read()
     except Exception as e:
         logger.debug("HTTP GET failed for %s: %s", url, e)
         return None
+    # raw bytes straight into orjson: no str decode, and no content-type check to trip over
+    try:
+        return orjson.loads(body)
+    except orjson.JSONDecodeError as e:
+        logger.debug("Failed to parse JSON from %s: %s", url, e)
+        return None
+
+_http_session: Optional[aiohttp.ClientSession] = None
+
+def get_http_session() -> aiohttp.ClientSession:
+    """
+    Process-wide pooled aiohttp session (keep-alive + DNS cache), created
+    lazily inside the running loop. Close it with close_http_session().
+    """
+    global _http_session
+    if _http_session is None or _http_session.closed:
+        _http_session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(
+                limit=0, limit_per_host=64, ttl_dns_cache=300, keepalive_timeout=60, enable_cleanup_closed=True
+            ),
+            timeout=aiohttp.ClientTimeout(total=20, connect=3, sock_read=10),
+        )
+    return _http_session
+
+async def close_http_session():
+    global _http_session
+    if _http_session is not None and not _http_session.closed:
+        await _http_session.close()
+    _http_session = None
 
 # compatibility wrapper expected by sniper.py
 async def fetch_json(url: str, timeout: int = 10) -> Optional[dict]:
-    async with aiohttp.ClientSession() as session:
-        return await _async_json_get(session, url, timeout=timeout)
+    return await _async_json_get(get_http_session(), url, timeout=timeout)
 
 # ---------- Price & MCAP fetching with fallbacks ----------
+def ttl_single_flight(ttl: float, max_entries: int = 1024, cacheable=bool):
+    """
+    Decorator for single-argument coroutines: a result is reused for `ttl`
+    seconds per argument, and concurrent calls for the same argument share one
+    in-flight task instead of each hitting the network. Exceptions and results
+    failing `cacheable` (default: None/empty) are not cached, so a failed
+    lookup is retried on the next call.
+    """
+    def decorator(fn):
+        cache: Dict[str, Tuple[float, object]] = {}
+        inflight: Dict[str, asyncio.Future] = {}
+
+        def _store(key, task):
+            inflight.pop(key, None)
+            if task.cancelled() or task.exception() is not None or not cacheable(task.result()):
+                return
+            now = time.monotonic()
+            if len(cache) >= max_entries:
+                for k in [k for k, (exp, _) in cache.items() if exp <= now]:
+                    del cache[k]
+            cache[key] = (now + ttl, task.result())
+
+        @functools.wraps(fn)
+        async def wrapper(key):
+            hit = cache.get(key)
+            if hit and hit[0] > time.monotonic():
+                return hit[1]
+            task = inflight.get(key)
+            if task is None:
+                task = inflight[key] = asyncio.ensure_future(fn(key))
+                task.add_done_callback(functools.partial(_store, key))
+            return await asyncio.shield(task)
+
+        return wrapper
+    return decorator
+
+TOKEN_INFO_TTL_SEC = float(os.environ.get("TOKEN_INFO_TTL_SEC", "3.0"))
+# raw Dexscreener token payloads; short because the price inside them is what we trade on
+DEXSCREENER_TTL_SEC = float(os.environ.get("DEXSCREENER_TTL_SEC", "5.0"))
+
+@ttl_single_flight(DEXSCREENER_TTL_SEC)
+async def fetch_dexscreener_token(ca: str) -> Optional[dict]:
+    """Dexscreener /tokens payload for one CA, shared by the price/mcap lookup and the name resolver."""
+    return await _async_json_get(get_http_session(), f"{DEXSCREENER_API}/{ca}")
+
+# the all-None result (source None) is this function's failure shape
+@ttl_single_flight(TOKEN_INFO_TTL_SEC, cacheable=lambda info: bool(info and info.get("source")))
 async def fetch_token_price_and_mcap(ca: str) -> Dict[str, Optional[float]]:
     """
     Priority:
@@ -466,117 +698,178 @@ async def fetch_token_price_and_mcap(ca: str) -> Dict[str, Optional[float]]:
     }
 
     ca_param = ca
-    async with aiohttp.ClientSession() as session:
-        # 1️⃣ Dexscreener
-        ds_url = f"{DEXSCREENER_API}/{ca_param}"
-        logger.debug("Attempting Dexscreener for %s -> %s", ca, ds_url)
-        ds_data = await _async_json_get(session, ds_url)
-        if ds_data:
-            pairs = ds_data.get("pairs") or []
-            token_info = ds_data.get("tokenInfo") or {}
-            ds_price = ds_supply = ds_mcap = None
-
-            if pairs and isinstance(pairs, list) and len(pairs) > 0:
-                first = pairs[0] or {}
-                ds_price = first.get("priceUsd") or first.get("price")
-                ds_mcap = first.get("marketCap")
-                ds_supply = first.get("circulatingSupply") or token_info.get("circulatingSupply")
-
-            if not ds_price:
-                ds_price = token_info.get("priceUsd") or token_info.get("price")
-            if not ds_supply:
-                ds_supply = token_info.get("circulatingSupply")
-            if not ds_mcap:
-                ds_mcap = token_info.get("marketCap")
+    session = get_http_session()
+    # 1️⃣ Dexscreener
+    logger.debug("Attempting Dexscreener for %s", ca)
+    ds_data = await fetch_dexscreener_token(ca)
+    if ds_data:
+        pairs = ds_data.get("pairs") or []
+        token_info = ds_data.get("tokenInfo") or {}
+        ds_price = ds_supply = ds_mcap = None
+
+        if pairs and isinstance(pairs, list) and len(pairs) > 0:
+            first = pairs[0] or {}
+            ds_price = first.get("priceUsd") or first.get("price")
+            ds_mcap = first.get("marketCap")
+            ds_supply = first.get("circulatingSupply") or token_info.get("circulatingSupply")
+
+        if not ds_price:
+            ds_price = token_info.get("priceUsd") or token_info.get("price")
+        if not ds_supply:
+            ds_supply = token_info.get("circulatingSupply")
+        if not ds_mcap:
+            ds_mcap = token_info.get("marketCap")
 
-            try:
-                price = float(ds_price) if ds_price is not None else None
-                supply = float(ds_supply) if ds_supply is not None else None
-                mcap = float(ds_mcap) if ds_mcap is not None else None
-            except Exception:
-                price = supply = mcap = None
-
-            if mcap:
-                result.update({
-                    "priceUsd": price,
-                    "circulatingSupply": supply,
-                    "marketCap": mcap,
-                    "source": "dexscreener:mcap"
-                })
-                logger.info("✅ Dexscreener MCAP for %s: %.2f (price=%s, supply=%s)", ca, mcap, price, supply)
-                return result
-
-            if price is not None and supply is not None:
-                computed = price * supply
-                result.update({
-                    "priceUsd": price,
-                    "circulatingSupply": supply,
-                    "marketCap": computed,
-                    "source": "dexscreener:calc"
-                })
-                logger.info("ℹ️ Dexscreener computed MCAP for %s: %.2f (price=%.8f × supply=%.2f)", ca, computed, price, supply)
-                return result
-
-            if price is not None:
-                result.update({
-                    "priceUsd": price,
-                    "circulatingSupply": None,
-                    "marketCap": None,
-                    "source": "dexscreener:price"
-                })
-                logger.info("ℹ️ Dexscreener price only for %s: %.8f", ca, price)
-                return result
-
-        # 2️⃣ Jupiter Lite API fallback (with retries)
-        j_url = f"https://lite-api.jup.ag/tokens/v2/search?query={ca_param}"
-        for attempt in range(1, 3):
-            try:
-                j_data = await _async_json_get(session, j_url)
-                if j_data and isinstance(j_data, list) and len(j_data) > 0:
-                    token = j_data[0]
-                    j_price = token.get("usdPrice")
-                    j_mcap = token.get("mcap")
-                    j_liquidity = token.get("liquidity")
-
-                    price = float(j_price) if j_price is not None else None
-                    mcap = float(j_mcap) if j_mcap is not None else None
-                    liquidity = float(j_liquidity) if j_liquidity is not None else None
-
-                    if mcap:
-                        result.update({
-                            "priceUsd": price,
-                            "circulatingSupply": None,
-                            "marketCap": mcap,
-                            "liquidity": liquidity,
-                            "source": "jupiter:mcap"
-                        })
-                        logger.info("🪙 Jupiter MCAP for %s: %.2f | price=%.8f | liquidity=%.2f",
-                                    ca, mcap, price or 0, liquidity or 0)
-                        return result
-
-                    elif price:
-                        result.update({
-                            "priceUsd": price,
-                            "circulatingSupply": None,
-                            "marketCap": None,
-                            "liquidity": liquidity,
-                            "source": "jupiter:price"
-                        })
-                        logger.info("🪙 Jupiter price only for %s: %.8f | liquidity=%.2f",
-                                    ca, price or 0, liquidity or 0)
-                        return result
-
-                if attempt < 2:
-                    await asyncio.sleep(0.6)
-            except Exception:
-                if attempt < 2:
-                    await asyncio.sleep(0.6)
-                    continue
+        try:
+            price = float(ds_price) if ds_price is not None else None
+            supply = float(ds_supply) if ds_supply is not None else None
+            mcap = float(ds_mcap) if ds_mcap is not None else None
+        except Exception:
+            price = supply = mcap = None
+
+        if mcap:
+            result.update({
+                "priceUsd": price,
+                "circulatingSupply": supply,
+                "marketCap": mcap,
+                "source": "dexscreener:mcap"
+            })
+            logger.info("✅ Dexscreener MCAP for %s: %.2f (price=%s, supply=%s)", ca, mcap, price, supply)
+            return result
+
+        if price is not None and supply is not None:
+            computed = price * supply
+            result.update({
+                "priceUsd": price,
+                "circulatingSupply": supply,
+                "marketCap": computed,
+                "source": "dexscreener:calc"
+            })
+            logger.info("ℹ️ Dexscreener computed MCAP for %s: %.2f (price=%.8f × supply=%.2f)", ca, computed, price, supply)
+            return result
+
+        if price is not None:
+            result.update({
+                "priceUsd": price,
+                "circulatingSupply": None,
+                "marketCap": None,
+                "source": "dexscreener:price"
+            })
+            logger.info("ℹ️ Dexscreener price only for %s: %.8f", ca, price)
+            return result
+
+    # 2️⃣ Jupiter Lite API fallback (with retries)
+    j_url = f"https://lite-api.jup.ag/tokens/v2/search?query={ca_param}"
+    for attempt in range(1, 3):
+        try:
+            j_data = await _async_json_get(session, j_url)
+            if j_data and isinstance(j_data, list) and len(j_data) > 0:
+                token = j_data[0]
+                j_price = token.get("usdPrice")
+                j_mcap = token.get("mcap")
+                j_liquidity = token.get("liquidity")
+
+                price = float(j_price) if j_price is not None else None
+                mcap = float(j_mcap) if j_mcap is not None else None
+                liquidity = float(j_liquidity) if j_liquidity is not None else None
+
+                if mcap:
+                    result.update({
+                        "priceUsd": price,
+                        "circulatingSupply": None,
+                        "marketCap": mcap,
+                        "liquidity": liquidity,
+                        "source": "jupiter:mcap"
+                    })
+                    logger.info("🪙 Jupiter MCAP for %s: %.2f | price=%.8f | liquidity=%.2f",
+                                ca, mcap, price or 0, liquidity or 0)
+                    return result
+
+                elif price:
+                    result.update({
+                        "priceUsd": price,
+                        "circulatingSupply": None,
+                        "marketCap": None,
+                        "liquidity": liquidity,
+                        "source": "jupiter:price"
+                    })
+                    logger.info("🪙 Jupiter price only for %s: %.8f | liquidity=%.2f",
+                                ca, price or 0, liquidity or 0)
+                    return result
+
+            if attempt < 2:
+                await asyncio.sleep(0.6)
+        except Exception:
+            if attempt < 2:
+                await asyncio.sleep(0.6)
+                continue
 
-        logger.warning("⚠️ Jupiter Lite API failed for %s after 2 retries — skipping.", ca)
+    logger.warning("⚠️ Jupiter Lite API failed for %s after 2 retries — skipping.", ca)
 
     logger.debug("All price/mcap/liquidity fallbacks failed for %s", ca)
     return result
+DEXSCREENER_BATCH_MAX = 30  # Dexscreener accepts up to 30 comma-separated addresses
+
+async def fetch_token_prices_batch(session: aiohttp.ClientSession, cas) -> Dict[str, dict]:
+    """
+    One Dexscreener request for up to DEXSCREENER_BATCH_MAX CAs.
+    Returns {ca: info} in fetch_token_price_and_mcap's shape, only for CAs
+    that came back with a price or market cap (first pair per token wins).
+    """
+    cas = list(cas)[:DEXSCREENER_BATCH_MAX]
+    if not cas:
+        return {}
+    data = await _async_json_get(session, f"{DEXSCREENER_API}/{','.join(cas)}")
+    wanted = set(cas)
+    out: Dict[str, dict] = {}
+    for pair in (data or {}).get("pairs") or []:
+        addr = ((pair or {}).get("baseToken") or {}).get("address")
+        if addr not in wanted or addr in out:
+            continue
+        try:
+            price = float(pair["priceUsd"]) if pair.get("priceUsd") is not None else None
+            mcap = float(pair["marketCap"]) if pair.get("marketCap") else None
+            liq = float((pair.get("liquidity") or {}).get("usd") or 0) or None
+        except Exception:
+            continue
+        if price is None and mcap is None:
+            continue
+        out[addr] = {
+            "priceUsd": price,
+            "circulatingSupply": None,
+            "marketCap": mcap,
+            "liquidity": liq,
+            "source": "dexscreener:batch",
+        }
+    logger.debug("Dexscreener batch: %d/%d CAs priced", len(out), len(cas))
+    return out
+def _parse_ds_liquidity(ds_data: Optional[dict]) -> Tuple[float, float, Optional[float]]:
+    """
+    (liquidity_usd, volume_usd_24h, sell_tax) from a Dexscreener /tokens payload,
+    read from the first pair in one pass. Dexscreener carries no tax field, so
+    sell_tax is None unless a pair reports one.
+    """
+    pairs = ds_data.get("pairs") if isinstance(ds_data, dict) else None
+    if not isinstance(pairs, list) or not pairs or not isinstance(pairs[0], dict):
+        return 0.0, 0.0, None
+    first = pairs[0]
+    liq = first.get("liquidity")
+    vol = first.get("volume")
+    liquidity_usd = liq.get("usd") if isinstance(liq, dict) else None
+    volume_usd = vol.get("h24") if isinstance(vol, dict) else None
+    sell_tax = first.get("sellTax")
+    try:
+        return (
+            float(liquidity_usd) if liquidity_usd is not None else 0.0,
+            float(volume_usd) if volume_usd is not None else 0.0,
+            float(sell_tax) if sell_tax is not None else None,
+        )
+    except (TypeError, ValueError):
+        return 0.0, 0.0, None
+
+async def get_dexscreener_data(ca: str) -> Tuple[float, float, Optional[float]]:
+    """(liquidity_usd, volume_usd_24h, sell_tax) for a CA, from the cached Dexscreener payload."""
+    return _parse_ds_liquidity(await fetch_dexscreener_token(ca))
 #------------Mcap--------------
 async def get_market_cap_or_priceinfo(
     ca: str,
@@ -630,14 +923,66 @@ async def get_market_cap_or_priceinfo(
     # Default fallback
     return 0.0, float(price) if price else None, supply, source, sell_tax, liq_locked, liquidity
 # ---------- SOL price helpers ----------
+JUPITER_PRICE_API = "https://lite-api.jup.ag/price/v3"
+SOL_PRICE_FALLBACK_USD = 150.0
+
+SOL_PRICE_LIVE_TTL_SEC = float(os.environ.get("SOL_PRICE_TTL", "15"))
+_sol_price_live: Tuple[float, float] = (0.0, 0.0)  # (monotonic ts, price) of the last good Jupiter fetch
+_sol_price_inflight: Optional[asyncio.Task] = None
+
+async def fetch_sol_price_usd(session: aiohttp.ClientSession) -> float:
+    """
+    Live SOL/USD from Jupiter Price v3 without blocking the event loop.
+    A good price is reused for SOL_PRICE_LIVE_TTL_SEC, and concurrent callers
+    share one in-flight request (single-flight).
+    Returns SOL_PRICE_FALLBACK_USD if the price cannot be fetched.
+    """
+    global _sol_price_inflight
+    ts, cached = _sol_price_live
+    if cached and time.monotonic() - ts < SOL_PRICE_LIVE_TTL_SEC:
+        return cached
+    if _sol_price_inflight is None or _sol_price_inflight.done():
+        _sol_price_inflight = asyncio.ensure_future(_fetch_sol_price_usd(session))
+    # shield: one caller being cancelled must not cancel the shared request
+    return await asyncio.shield(_sol_price_inflight)
+
+async def _fetch_sol_price_usd(session: aiohttp.ClientSession) -> float:
+    global _sol_price_live
+    try:
+        async with session.get(JUPITER_PRICE_API, params={"ids": WSOL_MINT}, timeout=10) as r:
+            data = await r.json(loads=orjson.loads)
+        if WSOL_MINT in data and "usdPrice" in data[WSOL_MINT]:
+            price = float(data[WSOL_MINT]["usdPrice"])
+            logger.info(f"💵 Live SOL price: ${price:.2f}")
+            _sol_price_live = (time.monotonic(), price)
+            return price
+        logger.error(f"❌ Invalid SOL price response: {data}")
+    except Exception as e:
+        logger.error(f"❌ Failed to fetch SOL price: {e}")
+    logger.warning(f"⚠️ Using fallback SOL price: ${SOL_PRICE_FALLBACK_USD:.2f}")
+    return SOL_PRICE_FALLBACK_USD
+
+SOL_PRICE_TTL_SEC = 2.0
+_sol_price_cache: Tuple[float, float] = (0.0, 0.0)  # (monotonic ts, price)
 
 def get_sol_price_usd() -> float:
+    """
+    SOL/USD from Coingecko, cached for SOL_PRICE_TTL_SEC so every conversion
+    within one trade reuses a single fetch. Fallback values are not cached.
+    """
+    global _sol_price_cache
+    ts, cached = _sol_price_cache
+    now = time.monotonic()
+    if cached and now - ts < SOL_PRICE_TTL_SEC:
+        return cached
     try:
         resp = requests.get(
             "https://api.coingecko.com/api/v3/simple/price?ids=solana&vs_currencies=usd",
             timeout=10
         )
-        return float(resp.json()["solana"]["usd"])
+        price = float(resp.json()["solana"]["usd"])
+        _sol_price_cache = (now, price)
+        return price
     except Exception as e:
         logger.debug("Coingecko SOL price fetch failed: %s — defaulting to 20.0", e)
         return 20.0
@@ -660,6 +1005,32 @@ def usd_to_lamports(usd_amount: float, apply_buy_fee: bool = False) -> int:
     return int(round(sol * LAMPORTS_PER_SOL))
 
 
+MICRO_USD = 1_000_000  # USD amounts are scaled to integer micro-dollars for lamport math
+
+def usd_to_lamports_at(usd_amount: float, sol_price_usd: float) -> int:
+    """USD → lamports at a known SOL price, using integer math (floors to whole lamports)."""
+    return usd_micros_to_lamports_at(round(usd_amount * MICRO_USD), sol_price_usd)
+
+
+def usd_micros_to_lamports_at(usd_micros: int, sol_price_usd: float) -> int:
+    """Integer micro-USD → lamports at a known SOL price (floors to whole lamports)."""
+    price_micros = round(sol_price_usd * MICRO_USD)
+    if price_micros <= 0:
+        return 0
+    return usd_micros * LAMPORTS_PER_SOL // price_micros
+
+
+def lamports_to_usd_at(lamports: int, sol_price_usd: float) -> float:
+    """lamports → USD at a known SOL price; integer math down to whole micro-dollars."""
+    return lamports * round(sol_price_usd * MICRO_USD) // LAMPORTS_PER_SOL / MICRO_USD
+
+
+def net_of_fee_micros(usd_amount: float, fee_percent: float) -> int:
+    """usd_amount minus fee_percent, as integer micro-USD (fee applied in basis points)."""
+    fee_bps = round(fee_percent * 100)
+    return round(usd_amount * MICRO_USD) * (10_000 - fee_bps) // 10_000
+
+
 def lamports_to_usd(lamports: int) -> float:
     """Convert lamports → USD."""
     return sol_to_usd(lamports / LAMPORTS_PER_SOL)
@@ -785,6 +1156,11 @@ def _ensure_keypair(raw) -> Keypair:
     raise RuntimeError("Unable to turn provided privkey into a Keypair for signing")
 # === Jupiter Swap Execution ===
 # ----Jupiter_Swap----
+@functools.lru_cache(maxsize=8)
+def decode_keypair(b58: str) -> Keypair:
+    """base58 secret → Keypair, cached so repeat swaps don't redo the decode and key derivation."""
+    return Keypair.from_base58_string(b58.strip())
+
 async def execute_jupiter_swap_from_quote(
     session: aiohttp.ClientSession,
     quote: dict,
@@ -813,27 +1189,8 @@ async def execute_jupiter_swap_from_quote(
 
     fee_percent = fee_percent if fee_percent is not None else BUY_FEE_PERCENT
 
-    # === Fetch live SOL price using Jupiter Ultra API ===
-    async def fetch_sol_usd_price() -> float:
-        PRICE_URL = "https://lite-api.jup.ag/price/v3?ids=So11111111111111111111111111111111111111112"
-        try:
-            async with session.get(PRICE_URL, timeout=10) as r:
-                data = await r.json()
-                sol_key = "So11111111111111111111111111111111111111112"
-                if sol_key in data and "usdPrice" in data[sol_key]:
-                    price = float(data[sol_key]["usdPrice"])
-                    logger.info(f"💵 Live SOL price: ${price:.2f}")
-                    return price
-                else:
-                    logger.error(f"❌ Invalid SOL price response: {data}")
-                    return 150.0  # Fallback price
-        except Exception as e:
-            logger.error(f"❌ Failed to fetch SOL price: {e}")
-            return 150.0  # Fallback price
-
-    SOL_PRICE_USD = await fetch_sol_usd_price()
-    if SOL_PRICE_USD == 150.0:
-        logger.warning(f"⚠️ Using fallback SOL price: ${SOL_PRICE_USD:.2f}")
+    # === Fetch live SOL price using Jupiter Price API ===
+    SOL_PRICE_USD = await fetch_sol_price_usd(session)
 
     input_mint = quote.get("inputMint")
     output_mint = quote.get("outputMint")
@@ -853,7 +1210,7 @@ async def execute_jupiter_swap_from_quote(
 
     # === Load wallet ===
     try:
-        wallet = privkey if isinstance(privkey, Keypair) else Keypair.from_base58_string(privkey.strip())
+        wallet = privkey if isinstance(privkey, Keypair) else decode_keypair(privkey)
         pubkey_str = str(wallet.pubkey())
     except Exception as e:
         logger.error(f"❌ Failed to load wallet keypair: {e}")
@@ -862,7 +1219,7 @@ async def execute_jupiter_swap_from_quote(
     payer_wallet = None
     if payer_privkey:
         try:
-            payer_wallet = payer_privkey if isinstance(payer_privkey, Keypair) else Keypair.from_base58_string(payer_privkey.strip())
+            payer_wallet = payer_privkey if isinstance(payer_privkey, Keypair) else decode_keypair(payer_privkey)
         except Exception as e:
             logger.error(f"❌ Failed to load payer wallet keypair: {e}")
             return None
@@ -872,8 +1229,9 @@ async def execute_jupiter_swap_from_quote(
         fake_tx = f"DRY_RUN_BUY_{int(time.time())}"
         fee_usd = usd_value * (fee_percent / 100.0)
         try:
-            update_compound_balance(after_profit_usd=-usd_value)
-            record_buy(
+            await asyncio.to_thread(update_compound_balance, after_profit_usd=-usd_value)
+            await asyncio.to_thread(
+                record_buy,
                 ca=output_mint,
                 coin_name=coin_name or "Unknown",
                 market_cap=market_cap or 0,
@@ -900,7 +1258,6 @@ async def execute_jupiter_swap_from_quote(
 
     ORDER_URL = "https://lite-api.jup.ag/ultra/v1/order"
     EXEC_URL = "https://lite-api.jup.ag/ultra/v1/execute"
-    wallet = privkey if isinstance(privkey, Keypair) else Keypair.from_base58_string(privkey.strip())
     params = {
     "inputMint": input_mint,
     "outputMint": output_mint,
@@ -927,13 +1284,15 @@ async def execute_jupiter_swap_from_quote(
 
     # === Execute BUY ===
     for attempt in range(1, 4):
+        if attempt > 1:
+            await asyncio.sleep(backoff_delay(attempt - 1))
         try:
             async with session.get(ORDER_URL, params=params, timeout=15) as r:
                 if r.headers.get("Content-Type", "").startswith("text/plain"):
                     text = await r.text()
                     logger.error(f"❌ Non-JSON response from /order: {text} (Status: {r.status})")
                     continue
-                order = await r.json()
+                order = await r.json(loads=orjson.loads)
 
             if not order.get("transaction"):
                 logger.error(f"❌ Invalid order: {order}")
@@ -956,14 +1315,15 @@ async def execute_jupiter_swap_from_quote(
                     text = await resp.text()
                     logger.error(f"❌ Non-JSON response from /execute: {text} (Status: {resp.status})")
                     continue
-                res = await resp.json()
+                res = await resp.json(loads=orjson.loads)
 
             if res.get("status", "").lower() == "success":
                 sig = res.get("signature") or res.get("txid")
                 usd_value = (in_amount / 1e9) * SOL_PRICE_USD
                 fee_usd = usd_value * (fee_percent / 100.0)
-                update_compound_balance(after_profit_usd=-usd_value)
-                record_buy(
+                await asyncio.to_thread(update_compound_balance, after_profit_usd=-usd_value)
+                await asyncio.to_thread(
+                    record_buy,
                     ca=output_mint,
                     coin_name=coin_name or "Unknown",
                     market_cap=market_cap or 0,
@@ -979,16 +1339,21 @@ async def execute_jupiter_swap_from_quote(
                 logger.warning(f"Attempt {attempt}/3 failed: {res}")
         except Exception as e:
             logger.warning(f"⚠️ Attempt {attempt}/3 error: {e}")
-            await asyncio.sleep(attempt * 2)
 
     logger.error(f"❌ BUY failed after 3 retries for {coin_name or output_mint}")
     return None
 # ---------Jupiter_Swap------------
+# Base58 mint / CA patterns, compiled once (extract_contract_address runs per message)
+_MINT_RE = re.compile(r"[1-9A-HJ-NP-Za-km-z]{32,44}")
+_CA_RE = re.compile(r"([1-9A-HJ-NP-Za-km-z]{32,44}(?:pump|bonk)?)")
+_TME_START_CA_RE = re.compile(r"https?://t\.me/[^\s?]+\?start=([1-9A-HJ-NP-Za-km-z]{32,44}(?:pump|bonk)?)")
+CA_MIN_LEN = 32  # shortest base58 mint; shorter strings cannot match, so skip the regex
+
 def sanitize_mint(mint: str) -> Optional[str]:
     """Ensure mint is a valid base58 Solana address (basic check)."""
     if not mint:
         return None
-    if re.fullmatch(r"[1-9A-HJ-NP-Za-km-z]{32,44}", mint):
+    if _MINT_RE.fullmatch(mint):
         return mint
     return None
 
@@ -999,13 +1364,14 @@ def get_dynamic_fee(base_percent=1.0, congestion=False):
     return base_percent + 0.5 if congestion else base_percent
 
 # ----Detect_Cas-----------
-def extract_contract_address(msg) -> Optional[dict]:
+def extract_contract_address(msg) -> dict:
     """
     Extract CA from Telegram message:
       1) Try buttons URL first
       2) Try t.me start param
       3) Fallback: raw text pattern
-    Returns {"ca": "<...>"} or None
+    Returns {"ca": "<...>"}, or {"ca": None, "reason": "<buttons>,<text>"} when
+    nothing matched, e.g. "no_ca_in_url,no_text_match".
     """
     ca = None
     diagnostics = {"buttons_present": False, "buttons_have_urls": False, "buttons_url_matched": False, "text_has_ca_pattern": False}
@@ -1020,7 +1386,7 @@ def extract_contract_address(msg) -> Optional[dict]:
                 url = getattr(btn, "url", "") or ""
                 if url:
                     diagnostics["buttons_have_urls"] = True
-                    m = re.search(r"([1-9A-HJ-NP-Za-km-z]{32,44}(?:pump|bonk)?)", url)
+                    m = _CA_RE.search(url) if len(url) >= CA_MIN_LEN else None
                     if m:
                         ca = m.group(1)
                         diagnostics["buttons_url_matched"] = True
@@ -1031,21 +1397,29 @@ def extract_contract_address(msg) -> Optional[dict]:
         logger.debug("Error while scanning buttons for CA", exc_info=True)
 
     # 2) t.me start=CA link
-    if not ca and text:
-        m = re.search(r"https?://t\.me/[^\s?]+\?start=([1-9A-HJ-NP-Za-km-z]{32,44}(?:pump|bonk)?)", text)
+    has_ca_room = len(text) >= CA_MIN_LEN
+    if not ca and has_ca_room:
+        m = _TME_START_CA_RE.search(text)
         if m:
             ca = m.group(1)
 
     # 3) fallback text search
-    if not ca and text:
-        m = re.search(r"([1-9A-HJ-NP-Za-km-z]{32,44}(?:pump|bonk)?)", text)
+    if not ca and has_ca_room:
+        m = _CA_RE.search(text)
         if m:
             ca = m.group(1)
             diagnostics["text_has_ca_pattern"] = True
 
     if not ca:
+        if not diagnostics["buttons_present"]:
+            reason = "no_buttons"
+        elif not diagnostics["buttons_have_urls"]:
+            reason = "no_button_urls"
+        else:
+            reason = "no_ca_in_url"
+        reason += ",no_text_match" if has_ca_room else ",text_too_short"
         logger.debug("extract_contract_address diagnostics: %s, text_sample=%s", diagnostics, (text[:400] if text else ""))
-        return None
+        return {"ca": None, "reason": reason}
     return {"ca": ca}
 
 # ---------- DRY_RUN support ----------
@@ -1058,15 +1432,43 @@ def on_successful_buy():
         logger.info("DRY_RUN: Buy simulated successfully")
 
 # ---------- Async queue helpers ----------
+# Pending CAs live in an asyncio.PriorityQueue as (-enqueued_at, ca): newest first.
+PENDING_CA_MAX = 64
+PENDING_CA_MAX_AGE_SEC = float(os.environ.get("PENDING_CA_MAX_AGE_SEC", "20"))
+
 async def enqueue_ca(queue, ca: str):
-    if not is_ca_processed(ca):
-        await queue.put(ca)
-        logger.debug("CA queued: %s", ca)
-    else:
+    if is_ca_processed(ca):
         logger.debug("CA skipped, already processed: %s", ca)
-async def dequeue_ca(queue):
-    if queue.empty():
-        return None
-    return await queue.get()
+        return
+    if queue.qsize() >= PENDING_CA_MAX:
+        # full: keep only the newest entries, dropping the oldest to make room
+        items = sorted(queue.get_nowait() for _ in range(queue.qsize()))
+        for item in items[PENDING_CA_MAX - 1:]:
+            logger.debug("CA queue full, dropping oldest: %s", item[1])
+        for item in items[:PENDING_CA_MAX - 1]:
+            queue.put_nowait(item)
+    queue.put_nowait((-time.monotonic(), ca))
+    logger.debug("CA queued: %s", ca)
+
+async def dequeue_cas(queue, max_items: int = 8) -> list:
+    """
+    Block until at least one CA is queued, then take up to max_items fresh
+    CAs (newest first) in one wakeup, dropping stale ones along the way.
+    Returns [(enqueued_at, ca), ...] with enqueued_at on the monotonic clock.
+    """
+    while True:
+        batch = [await queue.get()]
+        while len(batch) < max_items and not queue.empty():
+            batch.append(queue.get_nowait())
+        now = time.monotonic()
+        fresh = []
+        for neg_ts, ca in batch:
+            age = now + neg_ts
+            if age <= PENDING_CA_MAX_AGE_SEC:
+                fresh.append((-neg_ts, ca))
+            else:
+                logger.info("Dropping stale CA %s (queued %.1fs ago)", ca, age)
+        if fresh:
+            return fresh
 
 # End of utils.py